@@ -0,0 +1,481 @@
+"""
+Offline issue extraction through a batch API, for backfills that don't need
+interactive latency:
+
+    python batch_extraction.py submit            # write the job files and submit them
+    python batch_extraction.py status   JOB_ID
+    python batch_extraction.py ingest   JOB_ID   # wait, then store the results
+    python batch_extraction.py resubmit JOB_ID   # send failed or expired requests again
+    python batch_extraction.py run               # all of the above in one go
+
+Each job lives under BATCH_JOBS_DIR (default .cache/batch_jobs) as one or
+more <job_id>.requests-<n>.jsonl parts (each within the Batch API's limits
+of BATCH_MAX_REQUESTS requests and BATCH_MAX_MB), <job_id>.items.jsonl
+(metadata for fan-out) and <job_id>.json (state), so a run can be picked up
+again by job id after a crash or restart. --local swaps the OpenAI Batch API
+for LocalBatchClient.
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from rag_generation import extraction_plan, extraction_request, issue_doc, parse_extraction
+from run_metrics import incr
+
+
+ENDPOINT = "/v1/chat/completions"
+DONE_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def jobs_dir() -> str:
+    return os.getenv("BATCH_JOBS_DIR", os.path.join(".cache", "batch_jobs"))
+
+
+def _job_path(job_id: str, suffix: str, root: Optional[str] = None) -> str:
+    return os.path.join(root or jobs_dir(), f"{job_id}.{suffix}")
+
+
+def load_state(job_id: str, root: Optional[str] = None) -> Dict:
+    with open(_job_path(job_id, "json", root), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(state: Dict, root: Optional[str] = None) -> None:
+    path = _job_path(state["job_id"], "json", root)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+class OpenAIBatchClient:
+    """Thin wrapper over the OpenAI Files and Batches endpoints."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from rag_generation import client as default_client
+
+            client = default_client
+        if client is None:
+            raise RuntimeError("OPENAI_API_KEY not set; use --local or set a key.")
+        self.client = client
+
+    def submit(self, requests_path: str, metadata: Optional[Dict] = None) -> str:
+        with open(requests_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=ENDPOINT,
+            completion_window="24h",
+            metadata=metadata or None,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> Dict:
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+            "completed": counts.completed if counts else 0,
+            "failed": counts.failed if counts else 0,
+            "total": counts.total if counts else 0,
+        }
+
+    def iter_lines(self, file_id: str) -> Iterator[str]:
+        with self.client.files.with_streaming_response.content(file_id) as response:
+            for line in response.iter_lines():
+                if line.strip():
+                    yield line
+
+
+def echo_responder(body: Dict) -> str:
+    """Deterministic stand-in answer: every text is relevant, its first sentence the one issue."""
+    text = body["messages"][-1]["content"].split("\n", 1)[-1].strip().strip('"')
+    return json.dumps({"relevant": True, "issues": [text.split(".")[0].strip()[:200]]})
+
+
+class LocalBatchClient:
+    """
+    Stand-in for OpenAIBatchClient that answers every request with
+    responder(body) -> content (echo_responder by default; inject your own
+    in tests) and writes an output file in the Batch API's format. A
+    responder that raises produces an error line for that request. Batches
+    finish on the first status poll after submit, and live under root so
+    they survive a restart like real ones.
+    """
+
+    def __init__(self, responder: Optional[Callable[[Dict], str]] = None, root: Optional[str] = None):
+        self.responder = responder or echo_responder
+        self.root = root or os.path.join(jobs_dir(), "local")
+        os.makedirs(self.root, exist_ok=True)
+
+    def submit(self, requests_path: str, metadata: Optional[Dict] = None) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        with open(requests_path, "r", encoding="utf-8") as src, open(
+            os.path.join(self.root, f"{batch_id}.input.jsonl"), "w", encoding="utf-8"
+        ) as dst:
+            dst.write(src.read())
+        return batch_id
+
+    def status(self, batch_id: str) -> Dict:
+        output_path = os.path.join(self.root, f"{batch_id}.output.jsonl")
+        if not os.path.exists(output_path):
+            self._run(batch_id, output_path)
+        completed = failed = 0
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if json.loads(line).get("error"):
+                    failed += 1
+                else:
+                    completed += 1
+        return {
+            "status": "completed",
+            "output_file_id": output_path,
+            "error_file_id": None,
+            "completed": completed,
+            "failed": failed,
+            "total": completed + failed,
+        }
+
+    def _run(self, batch_id: str, output_path: str) -> None:
+        tmp = output_path + ".tmp"
+        with open(os.path.join(self.root, f"{batch_id}.input.jsonl"), "r", encoding="utf-8") as src, open(
+            tmp, "w", encoding="utf-8"
+        ) as out:
+            for line in src:
+                request = json.loads(line)
+                try:
+                    content = self.responder(request["body"])
+                    result = {
+                        "response": {
+                            "status_code": 200,
+                            "body": {"choices": [{"message": {"role": "assistant", "content": content}}]},
+                        },
+                        "error": None,
+                    }
+                except Exception as e:
+                    result = {"response": None, "error": {"code": "local_error", "message": str(e)}}
+                out.write(json.dumps({"id": uuid.uuid4().hex, "custom_id": request["custom_id"], **result}) + "\n")
+        os.replace(tmp, output_path)
+
+    def iter_lines(self, file_id: str) -> Iterator[str]:
+        with open(file_id, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def _write_parts(job_id: str, lines: Iterator[str], root: Optional[str], first_part: int = 0) -> List[Dict]:
+    """
+    Split request lines into part files of at most BATCH_MAX_REQUESTS lines
+    and BATCH_MAX_MB bytes (the Batch API allows 50,000 and 200 MB per batch).
+    """
+    max_requests = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+    max_bytes = int(float(os.getenv("BATCH_MAX_MB", "190")) * 1024 * 1024)
+    parts: List[Dict] = []
+    f = None
+    for line in lines:
+        size = len(line.encode("utf-8"))
+        if f is None or parts[-1]["requests"] >= max_requests or parts[-1]["bytes"] + size > max_bytes:
+            if f is not None:
+                f.close()
+            n = first_part + len(parts)
+            path = _job_path(job_id, f"requests-{n}.jsonl", root)
+            f = open(path, "w", encoding="utf-8")
+            parts.append(
+                {
+                    "part": n,
+                    "requests_path": path,
+                    "requests": 0,
+                    "bytes": 0,
+                    "batch_id": None,
+                    "status": "created",
+                    "output_file_id": None,
+                    "error_file_id": None,
+                    "ingested": False,
+                    "failed": [],
+                    "resubmitted": False,
+                }
+            )
+        f.write(line)
+        parts[-1]["requests"] += 1
+        parts[-1]["bytes"] += size
+    if f is not None:
+        f.close()
+    return parts
+
+
+def create_job(
+    items: List[Dict], model: str = "gpt-4o-mini", root: Optional[str] = None, dedup: Optional[bool] = None
+) -> Optional[str]:
+    """
+    Write the job's request parts (one classify+extract request per
+    extraction_plan representative) and the items file mapping each item to
+    the request whose answer it takes. Returns the new job id, or None when
+    no text needs a request.
+    """
+    items = [item for item in items if item.get("text", "").strip()]
+    texts = [item["text"].strip() for item in items]
+    plan = extraction_plan(texts, dedup)
+    if not plan:
+        print("Nothing to extract; no batch job created.")
+        return None
+
+    root = root or jobs_dir()
+    os.makedirs(root, exist_ok=True)
+    job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+    custom_ids: List[Optional[str]] = [None] * len(items)
+    for n, (_, members) in enumerate(plan):
+        for i in members:
+            custom_ids[i] = f"item-{n}"
+
+    request_lines = (
+        json.dumps(
+            {"custom_id": f"item-{n}", "method": "POST", "url": ENDPOINT, "body": extraction_request(texts[rep], model)},
+            ensure_ascii=False,
+        )
+        + "\n"
+        for n, (rep, _) in enumerate(plan)
+    )
+    parts = _write_parts(job_id, request_lines, root)
+    with open(_job_path(job_id, "items.jsonl", root), "w", encoding="utf-8") as f:
+        for item, custom_id in zip(items, custom_ids):
+            if custom_id is not None:
+                f.write(json.dumps({"custom_id": custom_id, "item": item}, ensure_ascii=False, default=str) + "\n")
+
+    _save_state(
+        {
+            "job_id": job_id,
+            "model": model,
+            "created_at": time.time(),
+            "items": sum(1 for c in custom_ids if c is not None),
+            "requests": len(plan),
+            "parts": parts,
+            "inserted": 0,
+        },
+        root,
+    )
+    print(f"Job {job_id}: {len(plan)} requests for {len(items)} texts in {len(parts)} batches.")
+    return job_id
+
+
+def submit_job(job_id: str, batch_client, root: Optional[str] = None) -> Dict:
+    """Submit every part that has no batch id yet."""
+    state = load_state(job_id, root)
+    for part in state["parts"]:
+        if part["batch_id"] is None:
+            part["batch_id"] = batch_client.submit(part["requests_path"], {"job_id": job_id, "part": str(part["part"])})
+            part["status"] = "submitted"
+            # Saved per part so a crash mid-submit never submits a part twice.
+            _save_state(state, root)
+            incr("batch_jobs_submitted")
+    return state
+
+
+def job_done(state: Dict) -> bool:
+    return all(part["status"] in DONE_STATUSES for part in state["parts"])
+
+
+def poll_job(job_id: str, batch_client, root: Optional[str] = None) -> Dict:
+    state = load_state(job_id, root)
+    for part in state["parts"]:
+        if part["batch_id"] is None or part["status"] in DONE_STATUSES:
+            continue
+        status = batch_client.status(part["batch_id"])
+        part.update(
+            status=status["status"],
+            output_file_id=status["output_file_id"],
+            error_file_id=status["error_file_id"],
+            counts={k: status[k] for k in ("completed", "failed", "total")},
+        )
+    _save_state(state, root)
+    return state
+
+
+def wait_for_job(
+    job_id: str,
+    batch_client,
+    poll_sec: Optional[float] = None,
+    timeout_sec: Optional[float] = None,
+    root: Optional[str] = None,
+) -> Dict:
+    """Poll until every part reaches a final status (BATCH_POLL_SEC, BATCH_TIMEOUT_SEC)."""
+    poll_sec = poll_sec if poll_sec is not None else float(os.getenv("BATCH_POLL_SEC", "60"))
+    timeout_sec = timeout_sec if timeout_sec is not None else float(os.getenv("BATCH_TIMEOUT_SEC", str(26 * 3600)))
+    deadline = time.time() + timeout_sec
+    while True:
+        state = poll_job(job_id, batch_client, root)
+        if job_done(state):
+            return state
+        if time.time() >= deadline:
+            raise TimeoutError(f"Batch job {job_id} still running after {timeout_sec:.0f}s")
+        done = sum((p.get("counts") or {}).get("completed", 0) for p in state["parts"])
+        print(f"Job {job_id}: {done}/{state['requests']} requests done")
+        time.sleep(poll_sec)
+
+
+def _part_custom_ids(part: Dict) -> List[str]:
+    with open(part["requests_path"], "r", encoding="utf-8") as f:
+        return [json.loads(line)["custom_id"] for line in f if line.strip()]
+
+
+def _load_members(job_id: str, root: Optional[str]) -> Dict[str, List[Dict]]:
+    members: Dict[str, List[Dict]] = {}
+    with open(_job_path(job_id, "items.jsonl", root), "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            members.setdefault(entry["custom_id"], []).append(entry["item"])
+    return members
+
+
+def iter_part_issues(part: Dict, members: Dict[str, List[Dict]], batch_client, answered: Set[str]) -> Iterator[Dict]:
+    """
+    Stream one part's output (complete, or partial for an expired or
+    cancelled batch) and yield issue documents, in the same shape
+    extract_issues_from_texts returns, for every item whose request came back
+    relevant with issues. Every custom_id that got a usable answer is added
+    to answered; the rest count as failed.
+    """
+    if not part.get("output_file_id"):
+        return
+    for line in batch_client.iter_lines(part["output_file_id"]):
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            continue
+        answered.add(result["custom_id"])
+        choices = (response.get("body") or {}).get("choices") or []
+        outcome = parse_extraction(choices[0]["message"]["content"] if choices else "")
+        if not outcome["relevant"] or not outcome["issues"]:
+            continue
+        for item in members.get(result["custom_id"], []):
+            yield issue_doc(item, item["text"].strip(), list(outcome["issues"]))
+
+
+def ingest_job(job_id: str, batch_client, store: Optional[Callable[[List[Dict]], int]] = None, root: Optional[str] = None) -> int:
+    """
+    Store the issues of every finished part not ingested yet
+    (data_extraction_pipeline.store_issues by default) and record which
+    requests failed, so resubmit_failed can send them again. Storing upserts
+    and state is saved per part, so re-ingesting after a crash is safe.
+    Returns the number of new issues.
+    """
+    state = load_state(job_id, root)
+    if store is None:
+        from data_extraction_pipeline import store_issues as store
+    members = _load_members(job_id, root)
+
+    inserted = 0
+    for part in state["parts"]:
+        if part["ingested"] or part["status"] not in DONE_STATUSES:
+            continue
+        answered: Set[str] = set()
+        chunk: List[Dict] = []
+        for doc in iter_part_issues(part, members, batch_client, answered):
+            chunk.append(doc)
+            if len(chunk) >= 500:
+                inserted += store(chunk)
+                chunk = []
+        if chunk:
+            inserted += store(chunk)
+        # Covers error-file entries, failed lines and requests an expired batch never reached.
+        part["failed"] = [cid for cid in _part_custom_ids(part) if cid not in answered]
+        part["ingested"] = True
+        if part["failed"]:
+            incr("batch_requests_failed", len(part["failed"]))
+            print(f"Job {job_id} part {part['part']} ({part['status']}): {len(part['failed'])} requests failed.")
+        _save_state(state, root)
+
+    state["inserted"] = state.get("inserted", 0) + inserted
+    _save_state(state, root)
+    return inserted
+
+
+def resubmit_failed(job_id: str, batch_client, root: Optional[str] = None) -> int:
+    """Write the failed requests of ingested parts into new parts and submit them. Returns how many."""
+    state = load_state(job_id, root)
+    retry = [p for p in state["parts"] if p["ingested"] and p["failed"] and not p["resubmitted"]]
+    if not retry:
+        return 0
+
+    def failed_lines() -> Iterator[str]:
+        for part in retry:
+            wanted = set(part["failed"])
+            with open(part["requests_path"], "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip() and json.loads(line)["custom_id"] in wanted:
+                        yield line
+
+    first = max(p["part"] for p in state["parts"]) + 1
+    new_parts = _write_parts(job_id, failed_lines(), root, first_part=first)
+    for part in retry:
+        part["resubmitted"] = True
+    state["parts"].extend(new_parts)
+    _save_state(state, root)
+    submit_job(job_id, batch_client, root)
+    count = sum(p["requests"] for p in new_parts)
+    print(f"Job {job_id}: resubmitted {count} failed requests in {len(new_parts)} batches.")
+    return count
+
+
+def run_backfill(batch_client, job_id: Optional[str] = None, model: str = "gpt-4o-mini") -> int:
+    """
+    Create (or resume) a job over every post and comment, wait for it, store
+    the results, and resubmit failed requests up to BATCH_RESUBMIT_ROUNDS times.
+    """
+    if job_id is None:
+        from data_extraction_pipeline import collect_items
+
+        job_id = create_job(collect_items(), model)
+        if job_id is None:
+            return 0
+    submit_job(job_id, batch_client)
+    rounds = int(os.getenv("BATCH_RESUBMIT_ROUNDS", "1"))
+    inserted = 0
+    for round_no in range(rounds + 1):
+        wait_for_job(job_id, batch_client)
+        inserted += ingest_job(job_id, batch_client)
+        if round_no == rounds or not resubmit_failed(job_id, batch_client):
+            break
+    print(f"Job {job_id}: stored {inserted} new issues.")
+    return inserted
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Issue extraction backfill through the batch API.")
+    parser.add_argument("command", choices=["submit", "status", "ingest", "resubmit", "run"])
+    parser.add_argument("job_id", nargs="?", default=None, help="Resume this job instead of creating one")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--local", action="store_true", help="Answer requests locally instead of calling OpenAI")
+    args = parser.parse_args()
+    batch_client = LocalBatchClient() if args.local else OpenAIBatchClient()
+
+    if args.command == "run":
+        run_backfill(batch_client, args.job_id, args.model)
+    elif args.command == "submit":
+        if args.job_id is None:
+            from data_extraction_pipeline import collect_items
+
+            args.job_id = create_job(collect_items(), args.model)
+        if args.job_id is not None:
+            state = submit_job(args.job_id, batch_client)
+            print(f"Job {args.job_id} submitted as {', '.join(p['batch_id'] for p in state['parts'])}.")
+    elif args.job_id is None:
+        parser.error(f"{args.command} needs a job id")
+    elif args.command == "status":
+        state = poll_job(args.job_id, batch_client)
+        print(json.dumps(state, indent=2))
+    elif args.command == "resubmit":
+        resubmit_failed(args.job_id, batch_client)
+    else:
+        wait_for_job(args.job_id, batch_client)
+        print(f"Job {args.job_id}: stored {ingest_job(args.job_id, batch_client)} new issues.")
@@ -0,0 +1,180 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Union
+
+from gemini_client import DEFAULT_GENERATION_CONFIG
+from generation_executor import generate_with_retry
+from prompt_packing import dumps_compact, estimate_tokens
+from run_metrics import incr
+
+
+# JSON mode: the model must answer with one object keyed by post_id.
+BATCH_GENERATION_CONFIG = {**DEFAULT_GENERATION_CONFIG, "responseMimeType": "application/json"}
+
+
+def output_budget(generation_config: Optional[Dict] = None) -> int:
+    """Answer tokens a batch may plan for: maxOutputTokens with a safety margin (GEMINI_BATCH_OUTPUT_SAFETY)."""
+    max_output = int((generation_config or BATCH_GENERATION_CONFIG).get("maxOutputTokens", 8192))
+    return int(max_output * float(os.getenv("GEMINI_BATCH_OUTPUT_SAFETY", "0.7")))
+
+
+def plan_batches(
+    post_texts: List[str],
+    preamble_tokens: int,
+    token_budget: int,
+    max_posts: int,
+    output_per_post: int = 0,
+    output_limit: int = 0,
+) -> List[List[int]]:
+    """
+    Group post indexes (in order) so each batch's prompt stays within
+    token_budget, its expected answer (output_per_post per post) within
+    output_limit, and it holds at most max_posts posts. A post larger than
+    either budget still gets a batch of its own.
+    """
+    if output_per_post and output_limit:
+        max_posts = max(1, min(max_posts, output_limit // output_per_post))
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = preamble_tokens
+    for i, text in enumerate(post_texts):
+        cost = estimate_tokens(text)
+        if current and (used + cost > token_budget or len(current) >= max_posts):
+            batches.append(current)
+            current, used = [], preamble_tokens
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_prompt(posts: List[Dict], scripts_per_post: int) -> str:
+    """Per-batch part of the prompt; the shared preamble is sent as a prefix."""
+    ids = [str(p.get("post_id")) for p in posts]
+    return (
+        f"Generate exactly {scripts_per_post} scripts for EACH post in the dataset below.\n"
+        "Respond with ONLY a JSON object. Its keys are the post_id values "
+        f"({', '.join(ids)}), and each value is a single string holding all scripts for that post, "
+        "formatted exactly as you would for a single post.\n\n"
+        "DATASET (JSON):\n"
+        f"{dumps_compact(posts)}\n\n"
+        "Now generate the JSON object."
+    )
+
+
+def parse_batch_response(text: str, post_ids: List[str]) -> Dict[str, str]:
+    """post_id -> scripts for every post the response answered with non-empty text."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        start, end = (text or "").find("{"), (text or "").rfind("}")
+        try:
+            data = json.loads(text[start : end + 1]) if start >= 0 and end > start else {}
+        except ValueError:
+            data = {}
+    if not isinstance(data, dict):
+        return {}
+    out = {}
+    for post_id in post_ids:
+        value = data.get(post_id)
+        if isinstance(value, list):
+            value = "\n\n".join(str(v) for v in value)
+        if isinstance(value, str) and value.strip():
+            out[post_id] = value.strip()
+    return out
+
+
+def generate_batched(
+    api_key: str,
+    model: str,
+    preamble: str,
+    posts: List[Dict],
+    scripts_per_post: int,
+    fallback_prompts: List[str],
+    token_budget: Optional[int] = None,
+    max_posts: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    force: bool = False,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[Union[str, Exception]]:
+    """
+    Generate scripts for several posts per request. posts are the LLM rows
+    (each with a post_id); fallback_prompts[i] is the single-post prompt used
+    when post i is missing from, or unparseable in, its batch response. The
+    preamble goes out as a cached prefix (see GeminiClient.generate).
+    Results come back in post order, like generate_many.
+    """
+    token_budget = token_budget or int(os.getenv("GEMINI_BATCH_TOKEN_BUDGET", "24000"))
+    max_posts = max_posts or int(os.getenv("GEMINI_BATCH_MAX_POSTS", "5"))
+    max_workers = max_workers or int(os.getenv("GEMINI_MAX_WORKERS", "4"))
+    # A truncated answer is unparseable and sends the whole batch to fallback
+    # calls, so the expected output has to fit as well as the prompt.
+    per_script = int(os.getenv("GEMINI_SCRIPT_TOKENS", "400"))
+
+    # Posts without an id cannot be matched in a JSON answer; run them alone.
+    batchable = [i for i, p in enumerate(posts) if p.get("post_id")]
+    texts = [dumps_compact(posts[i]) for i in batchable]
+    groups = plan_batches(
+        texts,
+        estimate_tokens(preamble),
+        token_budget,
+        max_posts,
+        output_per_post=per_script * scripts_per_post,
+        output_limit=output_budget(),
+    )
+    plan = [[batchable[j] for j in group] for group in groups]
+    batchable_set = set(batchable)
+    singles = [i for i in range(len(posts)) if i not in batchable_set]
+
+    results: List[Union[str, Exception]] = [""] * len(posts)
+    done = 0
+
+    def _run_batch(indexes: List[int]) -> Dict[int, str]:
+        if len(indexes) == 1:
+            return {
+                indexes[0]: generate_with_retry(
+                    api_key, fallback_prompts[indexes[0]], model, force=force, prefix=preamble
+                )
+            }
+        group = [posts[i] for i in indexes]
+        ids = [str(p.get("post_id")) for p in group]
+        text = generate_with_retry(
+            api_key,
+            build_batch_prompt(group, scripts_per_post),
+            model,
+            force=force,
+            generation_config=BATCH_GENERATION_CONFIG,
+            prefix=preamble,
+            # Partial or unparseable answers are never cached.
+            validate=lambda answer: len(parse_batch_response(answer, ids)) == len(ids),
+        )
+        parsed = parse_batch_response(text, ids)
+        incr("gemini_batched_posts", len(parsed))
+        return {i: parsed[post_id] for i, post_id in zip(indexes, ids) if post_id in parsed}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-batch") as pool:
+        pending = {pool.submit(_run_batch, group): group for group in plan}
+        pending.update({pool.submit(_run_batch, [i]): [i] for i in singles})
+        while pending:
+            future = next(as_completed(pending))
+            group = pending.pop(future)
+            try:
+                answered = future.result()
+            except Exception as e:
+                if len(group) == 1:
+                    answered = {group[0]: e}
+                else:
+                    answered = {}
+            for i, value in answered.items():
+                results[i] = value
+                done += 1
+                if on_progress:
+                    on_progress(done, len(posts))
+            # Posts the batch did not answer fall back to their own call.
+            for i in group:
+                if i not in answered:
+                    incr("gemini_batch_fallbacks")
+                    pending[pool.submit(_run_batch, [i])] = [i]
+    return results
@@ -0,0 +1,89 @@
+import json
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+# Field order of the compact v2 encoding. Never reorder; append new fields only.
+FIELDS = ("comment_id", "author", "body", "ups", "url", "created_utc")
+V2_PREFIX = "v2:"
+
+# Parallel-array columns of the v1 layout, keyed by the comment field they hold.
+V1_ARRAY_COLUMNS = {
+    "comment_id": "comment_id_array",
+    "author": "comment_author_array",
+    "body": "comment_body_array",
+    "ups": "comment_ups_array",
+    "url": "comment_url_array",
+    "created_utc": "comment_created_utc_array",
+}
+
+
+def encode_comments(comments: Iterable[Dict]) -> str:
+    """
+    Encode comment dicts once, compactly: "v2:<count>:<json rows>", where each
+    row is a list in FIELDS order. The count prefix lets readers count
+    comments without parsing the JSON.
+    """
+    rows = [[c.get(f) for f in FIELDS] for c in comments or []]
+    return f"{V2_PREFIX}{len(rows)}:{json.dumps(rows, ensure_ascii=False, separators=(',', ':'))}"
+
+
+def is_v2(cell) -> bool:
+    return isinstance(cell, str) and cell.startswith(V2_PREFIX)
+
+
+def _split_v2(cell: str):
+    count, _, payload = cell[len(V2_PREFIX):].partition(":")
+    return int(count or 0), payload
+
+
+def comment_count(cell) -> int:
+    if not cell:
+        return 0
+    try:
+        if is_v2(cell):
+            return _split_v2(cell)[0]
+        arr = json.loads(cell)
+        return len(arr) if isinstance(arr, list) else 0
+    except Exception:
+        return 0
+
+
+def decode_comments(cell, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+    """
+    Decode a comments_array cell written by either schema. Only the requested
+    fields are materialized; by default all of FIELDS.
+    """
+    if not cell:
+        return []
+    wanted = tuple(fields or FIELDS)
+    try:
+        if is_v2(cell):
+            _, payload = _split_v2(cell)
+            positions = [(f, FIELDS.index(f)) for f in wanted if f in FIELDS]
+            return [{f: row[i] if i < len(row) else None for f, i in positions} for row in json.loads(payload)]
+        arr = json.loads(cell)
+    except Exception:
+        return []
+    if not isinstance(arr, list):
+        return []
+    return [{f: c.get(f) for f in wanted} for c in arr if isinstance(c, dict)]
+
+
+def to_v1_json(cell) -> str:
+    """The v1 comments_array JSON (list of objects) for a cell of either schema."""
+    if not cell:
+        return "[]"
+    if not is_v2(cell):
+        return cell
+    return json.dumps(decode_comments(cell), ensure_ascii=False)
+
+
+def to_v1_columns(cell) -> Dict[str, str]:
+    """Values for the v1 parallel-array columns plus comments_array."""
+    comments = decode_comments(cell)
+    out = {
+        column: json.dumps([c.get(field) for c in comments], ensure_ascii=False)
+        for field, column in V1_ARRAY_COLUMNS.items()
+    }
+    out["comments_array"] = json.dumps(comments, ensure_ascii=False)
+    return out
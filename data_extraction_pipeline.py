@@ -2,7 +2,13 @@ from db import posts_collection, db
 from rag_generation import extract_issues_from_texts
 from match_feature import find_top_k_features
 
-def collect_posts_comments():
+def _print_progress(done, total):
+    if done % 50 == 0 or done == total:
+        print(f"Processed {done}/{total} texts")
+
+
+def collect_items():
+    """Posts and their embedded comments as extraction items with metadata."""
     items = []
 
     # Fetch posts + embedded comments with metadata
@@ -55,10 +61,11 @@ def collect_posts_comments():
                     }
                 )
 
-    print(f"Total texts to process: {len(items)}")
+    return items
 
-    issues_list = extract_issues_from_texts(items)
 
+def store_issues(issues_list):
+    """Match each issue to a feature and upsert it; returns the number of new issues."""
     issues_collection = db["issues"]
     inserted_count = 0
 
@@ -84,6 +91,16 @@ def collect_posts_comments():
         if result.upserted_id:  #count only new inserts
             inserted_count += 1
 
+    return inserted_count
+
+
+def collect_posts_comments():
+    items = collect_items()
+    print(f"Total texts to process: {len(items)}")
+
+    issues_list = extract_issues_from_texts(items, on_progress=_print_progress)
+    inserted_count = store_issues(issues_list)
+
     if inserted_count > 0:
         print(f"Extracted {inserted_count} new issues stored in DB (with matched features)")
     else:
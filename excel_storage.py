@@ -1,51 +1,45 @@
+import atexit
+import hashlib
 import json
 import os
-from datetime import datetime
+import threading
+import time
 from typing import Dict, Iterable, List, Optional
 
 import gspread
+from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 
+from run_metrics import incr
+from sheet_mirror import get_mirror, mirror_enabled
+from sheet_spool import SpoolFlusher, WriteSpool, get_spool, spool_enabled
+from sheet_rotation import PartitionIndex, current_period, partition_title, quote_title, rotation_mode
+from storage_schema import (
+    HEADERS,
+    HEADERS_V1,
+    _now_iso,
+    post_comment_block_row,
+    row_values,
+    subreddit_block_row,
+    summarize_rows,
+)
+
 
 SHEET_ID = os.getenv("GOOGLE_SHEET_ID", "")
 WORKSHEET_NAME = os.getenv("GOOGLE_WORKSHEET_NAME", "scraped_data")
 # Kept name for compatibility with existing imports/usages in app UI.
 EXCEL_PATH = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}" if SHEET_ID else "GOOGLE_SHEET_ID not set"
 
-HEADERS = [
-    "subreddit",
-    "post",
-    "posted on",
-    "author",
-    "likes",
-    "Comments",
-    "post_age_days",
-    "post_flair",
-    "post_id",
-    "post_title",
-    "post_selftext",
-    "post_url",
-    "post_upvote_ratio",
-    "post_num_comments",
-    "post_rank",
-    "comment_id_array",
-    "comment_author_array",
-    "comment_body_array",
-    "comment_ups_array",
-    "comment_url_array",
-    "comment_created_utc_array",
-    "comments_array",
-    "imgbb_link",
-    "scraped_at_utc",
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
 ]
 
-
-def _now_iso() -> str:
-    return datetime.utcnow().isoformat()
-
-
-def _dt_to_iso(val):
-    return val.isoformat() if val else None
+# The Streamlit app importlib.reload()s this module on every rerun; reuse the
+# existing cache so authorized handles really live for the whole process.
+_HANDLE_CACHE: Dict[tuple, Dict] = globals().get("_HANDLE_CACHE", {})
+_HANDLE_LOCK = globals().get("_HANDLE_LOCK") or threading.RLock()
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
 
 
 def _service_account_info() -> dict:
@@ -58,56 +52,411 @@ def _service_account_info() -> dict:
         raise RuntimeError("GOOGLE_SERVICE_ACCOUNT_JSON is not valid JSON.") from e
 
 
-def _worksheet():
-    if not SHEET_ID:
-        raise RuntimeError("Missing GOOGLE_SHEET_ID in environment/secrets.")
+def _count_api_calls(n: int = 1) -> None:
+    incr("sheets_api_calls", n)
+
+
+def _cache_key() -> tuple:
+    raw = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON", "").strip()
+    return (SHEET_ID, WORKSHEET_NAME, hashlib.sha256(raw.encode("utf-8")).hexdigest())
+
 
+def _open_handle() -> Dict:
     info = _service_account_info()
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    creds = Credentials.from_service_account_info(info, scopes=scopes)
+    creds = Credentials.from_service_account_info(info, scopes=SCOPES)
     gc = gspread.authorize(creds)
     sh = gc.open_by_key(SHEET_ID)
-    try:
-        ws = sh.worksheet(WORKSHEET_NAME)
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title=WORKSHEET_NAME, rows=1000, cols=len(HEADERS) + 5)
-    _ensure_headers(ws)
-    return ws
+    _count_api_calls()
+    return {"creds": creds, "client": gc, "spreadsheet": sh, "worksheets": {}, "headers": {}, "index": None}
 
 
-def _ensure_headers(ws):
+def _handle() -> Dict:
+    if not SHEET_ID:
+        raise RuntimeError("Missing GOOGLE_SHEET_ID in environment/secrets.")
+
+    key = _cache_key()
+    with _HANDLE_LOCK:
+        handle = _HANDLE_CACHE.get(key)
+        if handle is None:
+            handle = _open_handle()
+            _HANDLE_CACHE[key] = handle
+        creds = handle["creds"]
+        if not creds.valid:
+            creds.refresh(Request())
+        return handle
+
+
+def _worksheet(title: Optional[str] = None):
+    title = title or WORKSHEET_NAME
+    handle = _handle()
+    with _HANDLE_LOCK:
+        ws = handle["worksheets"].get(title)
+        if ws is None:
+            sh = handle["spreadsheet"]
+            try:
+                ws = sh.worksheet(title)
+                _count_api_calls()
+            except gspread.WorksheetNotFound:
+                ws = sh.add_worksheet(title=title, rows=1000, cols=len(HEADERS) + 5)
+                _count_api_calls(2)
+            # Header verification runs once per process, not once per read/append.
+            handle["headers"][title] = _ensure_headers(ws)
+            handle["worksheets"][title] = ws
+        return ws
+
+
+def _sheet_headers(title: Optional[str] = None) -> List[str]:
+    """Column layout of a worksheet: HEADERS, or HEADERS_V1 until migrated."""
+    title = title or WORKSHEET_NAME
+    _worksheet(title)
+    return _handle()["headers"][title]
+
+
+def _partition_index() -> PartitionIndex:
+    handle = _handle()
+    with _HANDLE_LOCK:
+        if handle["index"] is None:
+            index = PartitionIndex(handle["spreadsheet"], WORKSHEET_NAME)
+            index.load()
+            handle["index"] = index
+        return handle["index"]
+
+
+def _partitions() -> List[str]:
+    """Worksheets holding data rows, oldest first."""
+    if rotation_mode() == "none":
+        return [WORKSHEET_NAME]
+    return _partition_index().partitions()
+
+
+def _write_title() -> str:
+    """Worksheet new rows go to: the base sheet, or the current month's partition."""
+    if rotation_mode() == "none":
+        return WORKSHEET_NAME
+    period = current_period()
+    title = partition_title(WORKSHEET_NAME, period)
+    index = _partition_index()
+    handle = _handle()
+    index.ensure(title, period)
+    if handle.get("counted_for") != title:
+        # Once per process and per rotation: record counts of closed partitions.
+        uncounted = index.uncounted(exclude=title)
+        if uncounted:
+            last_rows = _partition_last_rows(uncounted)
+            index.set_counts({t: max(0, last - 1) for t, last in last_rows.items()}, _now_iso())
+        handle["counted_for"] = title
+    return title
+
+
+def reset_worksheet_cache() -> None:
+    """Drop cached clients, e.g. after the worksheet was deleted or renamed."""
+    with _HANDLE_LOCK:
+        _HANDLE_CACHE.clear()
+
+
+def _ensure_headers(ws) -> List[str]:
     row1 = ws.row_values(1)
+    _count_api_calls()
+    if row1 == HEADERS_V1:
+        # Not migrated yet (see migrate_schema_v2.py); keep writing the v1 layout.
+        return HEADERS_V1
     if row1 != HEADERS:
         ws.update("A1", [HEADERS])
+        _count_api_calls()
+    return HEADERS
 
 
-def _append_rows(rows: Iterable[List]):
-    ws = _worksheet()
+def _call_with_backoff(fn, *args, **kwargs):
+    retries = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+    backoff = float(os.getenv("SHEETS_BACKOFF_BASE_SEC", "2"))
+    for attempt in range(retries):
+        try:
+            result = fn(*args, **kwargs)
+            _count_api_calls()
+            return result
+        except gspread.exceptions.APIError as e:
+            _count_api_calls()
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status not in _RETRY_STATUSES or attempt == retries - 1:
+                raise
+            # Write quota is per minute; back off instead of failing the run.
+            time.sleep(backoff * (2 ** attempt))
+
+
+def _rejects_rows(e: Exception) -> bool:
+    """
+    4xx the Sheets API returns for the data itself (e.g. a cell over 50k
+    characters): retrying can never succeed. Auth, missing-sheet and
+    throttling errors are about the setup, not the rows, so they stay retryable.
+    """
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return isinstance(e, gspread.exceptions.APIError) and status is not None and 400 <= status < 500 and (
+        status not in (401, 403, 404, 408, 429)
+    )
+
+
+def _append_values(title: str, values: List[List]) -> None:
+    _call_with_backoff(_worksheet(title).append_rows, values, value_input_option="USER_ENTERED")
+
+
+def _append_rows(rows: Iterable[Dict]):
     rows = list(rows)
     if not rows:
         return
-    normalized = []
-    width = len(HEADERS)
+    title = _write_title()
+    headers = _sheet_headers(title)
+    _append_values(title, [row_values(r, headers) for r in rows])
+
+
+def _upsert_enabled() -> bool:
+    return os.getenv("GOOGLE_SHEET_UPSERT", "1").strip().lower() not in ("0", "false", "no")
+
+
+def _col_letter(col: int) -> str:
+    return gspread.utils.rowcol_to_a1(1, col).rstrip("1")
+
+
+def _post_id_index(titles: List[str]) -> Dict[str, tuple]:
+    """
+    post_id -> (worksheet title, row number), built from a single batched
+    read of the post_id column of every partition.
+    """
+    ranges = []
+    for title in titles:
+        col = _col_letter(_sheet_headers(title).index("post_id") + 1)
+        ranges.append(f"{quote_title(title)}!{col}:{col}")
+    sh = _handle()["spreadsheet"]
+    resp = _call_with_backoff(sh.values_batch_get, ranges, params={"majorDimension": "COLUMNS"})
+    index = {}
+    for title, value_range in zip(titles, resp.get("valueRanges", [])):
+        column = (value_range.get("values") or [[]])[0]
+        for row_num, post_id in enumerate(column[1:], start=2):
+            if post_id:
+                index[post_id] = (title, row_num)
+    return index
+
+
+def _upsert_rows(rows: Iterable[Dict]):
+    """
+    Update rows whose post_id already exists (in any partition) in place and
+    append the rest. Three API calls in the steady state: the batched
+    post_id column read, one values_batch_update and one append_rows. None
+    cells are skipped by the Sheets API, so fields a row leaves empty (e.g.
+    subreddit on non-first posts) keep their value.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    if not _upsert_enabled():
+        _append_rows(rows)
+        return
+
+    write_title = _write_title()
+    titles = _partitions()
+    if write_title not in titles:
+        titles.append(write_title)
+    index = _post_id_index(titles)
+    updates: Dict[str, Dict[int, List]] = {}
+    new_rows: List[List] = []
+    new_positions: Dict[str, int] = {}
+    write_headers = _sheet_headers(write_title)
     for r in rows:
-        if len(r) < width:
-            r = r + [None] * (width - len(r))
-        elif len(r) > width:
-            r = r[:width]
-        normalized.append(r)
-    ws.append_rows(normalized, value_input_option="USER_ENTERED")
+        post_id = r.get("post_id")
+        key = str(post_id) if post_id else ""
+        if key and key in index:
+            title, row_num = index[key]
+            updates.setdefault(title, {})[row_num] = row_values(r, _sheet_headers(title))
+            continue
+        row = row_values(r, write_headers)
+        if key and key in new_positions:
+            # Same post twice in one batch: later non-empty fields win.
+            earlier = new_rows[new_positions[key]]
+            new_rows[new_positions[key]] = [v if v is not None else e for e, v in zip(earlier, row)]
+        else:
+            if key:
+                new_positions[key] = len(new_rows)
+            new_rows.append(row)
+
+    if updates:
+        data = [
+            {
+                "range": f"{quote_title(title)}!A{row_num}:"
+                f"{gspread.utils.rowcol_to_a1(row_num, len(values))}",
+                "values": [values],
+            }
+            for title, by_row in updates.items()
+            for row_num, values in sorted(by_row.items())
+        ]
+        sh = _handle()["spreadsheet"]
+        _call_with_backoff(sh.values_batch_update, {"valueInputOption": "USER_ENTERED", "data": data})
+        if mirror_enabled():
+            for title, by_row in updates.items():
+                get_mirror(SHEET_ID, title).patch_rows(by_row)
+    if new_rows:
+        _append_values(write_title, new_rows)
+
+
+class SheetBatchWriter:
+    """
+    Buffers rows and writes them with a single upsert (see _upsert_rows) once
+    max_rows are pending, max_age_sec has passed since the first pending
+    row, or on flush()/context exit. Flushes are serialized so rows land in
+    the order they were added.
+
+    With a spool, rows are committed to it before anything else and only
+    removed once Google Sheets accepted them; a failed flush leaves them
+    there for the next flush (or the background SpoolFlusher) to retry.
+    """
+
+    def __init__(
+        self,
+        max_rows: Optional[int] = None,
+        max_age_sec: Optional[float] = None,
+        spool: Optional[WriteSpool] = None,
+    ):
+        self.max_rows = max_rows or int(os.getenv("SHEETS_BATCH_MAX_ROWS", "200"))
+        self.max_age_sec = max_age_sec if max_age_sec is not None else float(os.getenv("SHEETS_BATCH_MAX_AGE_SEC", "5"))
+        self.spool = spool
+        self._rows: List[Dict] = []
+        # _lock guards the buffer and timer only; _flush_lock serializes the
+        # network writes so a slow or retrying flush never blocks add().
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def add(self, rows: Iterable[Dict]) -> None:
+        with self._lock:
+            if self.spool is not None:
+                rows = list(rows)
+                self.spool.append(rows)
+            else:
+                self._rows.extend(rows)
+            pending = self.pending()
+            full = pending >= self.max_rows
+            if not full and pending and self._timer is None and self.max_age_sec > 0:
+                self._timer = threading.Timer(self.max_age_sec, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            if self.spool is not None:
+                return self.spool.depth()
+            return len(self._rows)
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                batch, self._rows = self._rows, []
+            if self.spool is not None:
+                try:
+                    self.spool.drain(_upsert_rows, self.max_rows, permanent=_rejects_rows)
+                except Exception as e:
+                    raise RuntimeError(
+                        f"{e} ({self.spool.depth()} rows kept in the local spool and will be retried)"
+                    ) from e
+                return
+            if not batch:
+                return
+            try:
+                _upsert_rows(batch)
+            except Exception:
+                # Put the batch back ahead of rows added meanwhile so order is kept.
+                with self._lock:
+                    self._rows[:0] = batch
+                raise
+
+    def _flush_from_timer(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Google Sheets buffered flush failed: {e}")
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            if self.spool is not None:
+                print(f"Google Sheets final flush failed: {e}")
+                return
+            with self._lock:
+                rows, self._rows = self._rows, []
+            try:
+                spool = get_spool()
+                spool.append(rows)
+                print(
+                    f"Google Sheets final flush failed: {e}. Saved {len(rows)} unwritten rows to {spool.path}; "
+                    "they are written on the next run with SHEETS_SPOOL enabled."
+                )
+            except Exception as spool_error:
+                print(f"Google Sheets final flush failed: {e}. Lost {len(rows)} unwritten rows ({spool_error}).")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+
+_DEFAULT_WRITER: Optional[SheetBatchWriter] = globals().get("_DEFAULT_WRITER")
+_SPOOL_FLUSHER: Optional[SpoolFlusher] = globals().get("_SPOOL_FLUSHER")
+
+
+def _default_writer() -> SheetBatchWriter:
+    global _DEFAULT_WRITER, _SPOOL_FLUSHER
+    with _HANDLE_LOCK:
+        if _DEFAULT_WRITER is None:
+            _DEFAULT_WRITER = SheetBatchWriter(spool=get_spool() if spool_enabled() else None)
+            atexit.register(_DEFAULT_WRITER._flush_at_exit)
+        if _DEFAULT_WRITER.spool is not None and _SPOOL_FLUSHER is None:
+            # Also drains rows left in the spool by a previous run.
+            _SPOOL_FLUSHER = SpoolFlusher(
+                _DEFAULT_WRITER.flush,
+                interval_sec=float(os.getenv("SHEETS_SPOOL_FLUSH_SEC", "15")),
+                max_backoff_sec=float(os.getenv("SHEETS_SPOOL_MAX_BACKOFF_SEC", "300")),
+            )
+            _SPOOL_FLUSHER.start()
+        return _DEFAULT_WRITER
+
+
+def flush_pending_rows() -> None:
+    """Write any rows still buffered (or spooled) by the append helpers."""
+    _default_writer().flush()
+
+
+def spool_status() -> Optional[Dict]:
+    """Depth and oldest-entry age of the local write spool; None when disabled."""
+    writer = _default_writer()
+    if writer.spool is None:
+        return None
+    status = writer.spool.stats()
+    status["flusher_failures"] = _SPOOL_FLUSHER.failures if _SPOOL_FLUSHER else 0
+    return status
+
+
+def spool_dead_letters(limit: int = 20) -> List[Dict]:
+    """Rows the spool set aside because Google Sheets kept rejecting them."""
+    writer = _default_writer()
+    return writer.spool.dead_letters(limit) if writer.spool is not None else []
+
+
+def requeue_dead_letters() -> int:
+    writer = _default_writer()
+    return writer.spool.requeue_dead_letters() if writer.spool is not None else 0
 
 
 def append_rows(rows: Iterable[Dict]) -> None:
     rows = list(rows or [])
     if not rows:
         return
-    as_lists = []
-    for row in rows:
-        as_lists.append([row.get(h) for h in HEADERS])
-    _append_rows(as_lists)
+    writer = _default_writer()
+    writer.add(rows)
+    writer.flush()
 
 
 def append_subreddit_block(
@@ -116,84 +465,13 @@ def append_subreddit_block(
     title: Optional[str] = None,
     description: Optional[str] = None,
 ) -> None:
-    row = [
-        subreddit,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        _now_iso(),
-    ]
-    _append_rows([row])
+    row = subreddit_block_row(subreddit, query=query, title=title, description=description)
+    _default_writer().add([row])
 
 
 def append_post_comment_block(post: Dict, comments: Iterable[Dict], show_subreddit: bool) -> None:
-    post_rank = post.get("post_rank")
-    post_label = f"post{post_rank}" if post_rank else "post"
-    comment_rows = list(comments) if comments else []
-    comments_array = [
-        {
-            "comment_id": c.get("id"),
-            "author": c.get("author"),
-            "body": c.get("body"),
-            "ups": c.get("ups"),
-            "url": c.get("url"),
-            "created_utc": _dt_to_iso(c.get("created_utc")),
-        }
-        for c in comment_rows
-    ]
-    comment_id_array = [c.get("comment_id") for c in comments_array]
-    comment_author_array = [c.get("author") for c in comments_array]
-    comment_body_array = [c.get("body") for c in comments_array]
-    comment_ups_array = [c.get("ups") for c in comments_array]
-    comment_url_array = [c.get("url") for c in comments_array]
-    comment_created_utc_array = [c.get("created_utc") for c in comments_array]
-
-    row = [
-        post.get("subreddit") if show_subreddit else None,
-        post_label,
-        _dt_to_iso(post.get("created_utc")),
-        post.get("author"),
-        post.get("ups"),
-        len(comment_rows),
-        post.get("post_age_days"),
-        post.get("link_flair_text"),
-        post.get("id"),
-        post.get("title"),
-        post.get("selftext"),
-        post.get("url"),
-        post.get("upvote_ratio"),
-        post.get("num_comments"),
-        post_rank,
-        json.dumps(comment_id_array, ensure_ascii=False),
-        json.dumps(comment_author_array, ensure_ascii=False),
-        json.dumps(comment_body_array, ensure_ascii=False),
-        json.dumps(comment_ups_array, ensure_ascii=False),
-        json.dumps(comment_url_array, ensure_ascii=False),
-        json.dumps(comment_created_utc_array, ensure_ascii=False),
-        json.dumps(comments_array, ensure_ascii=False),
-        post.get("imgbb_link"),
-        _now_iso(),
-    ]
-    _append_rows([row])
+    row = post_comment_block_row(post, comments, show_subreddit)
+    _default_writer().add([row])
 
 
 def append_post_row(post: Dict, post_rank: int) -> None:
@@ -212,6 +490,7 @@ def append_subreddits(records: Iterable[Dict]) -> None:
             title=rec.get("title"),
             description=rec.get("description"),
         )
+    flush_pending_rows()
 
 
 def append_posts(records: Iterable[Dict]) -> None:
@@ -222,9 +501,14 @@ def append_comments(subreddit: str, post_id: str, comments: Iterable[Dict]) -> N
     return None
 
 
-def _all_rows() -> List[Dict]:
-    ws = _worksheet()
-    values = ws.get_all_values()
+def _read_partition(title: str) -> List[Dict]:
+    ws = _worksheet(title)
+    if mirror_enabled():
+        # Serve reads from the local mirror; only newly appended rows are downloaded.
+        values = get_mirror(SHEET_ID, title).sync(ws)
+    else:
+        values = ws.get_all_values()
+        _count_api_calls()
     if not values:
         return []
     headers = values[0]
@@ -239,8 +523,128 @@ def _all_rows() -> List[Dict]:
     return rows
 
 
+def _read_your_writes() -> None:
+    # Make buffered writes from this process visible to reads. Spooled rows
+    # are safe on disk, so a failed flush must not block reads.
+    try:
+        flush_pending_rows()
+    except Exception as e:
+        if _default_writer().spool is None:
+            raise
+        print(f"Google Sheets flush before read failed: {e}")
+
+
+def _all_rows() -> List[Dict]:
+    _read_your_writes()
+    rows = []
+    for title in _partitions():
+        rows.extend(_read_partition(title))
+    return rows
+
+
+def _read_columns(titles: List[str], columns: List[str]) -> List[Dict]:
+    """
+    Rows of the given partitions holding only the requested columns, fetched
+    with one values_batch_get of whole-column ranges. Rows whose requested
+    cells are all empty are skipped.
+    """
+    _read_your_writes()
+    ranges = []
+    keys = []
+    for title in titles:
+        headers = _sheet_headers(title)
+        for name in columns:
+            if name in headers:
+                col = _col_letter(headers.index(name) + 1)
+                ranges.append(f"{quote_title(title)}!{col}2:{col}")
+                keys.append((title, name))
+    if not ranges:
+        return []
+    sh = _handle()["spreadsheet"]
+    resp = _call_with_backoff(sh.values_batch_get, ranges, params={"majorDimension": "COLUMNS"})
+    by_title: Dict[str, Dict[str, List]] = {title: {} for title in titles}
+    for (title, name), value_range in zip(keys, resp.get("valueRanges", [])):
+        by_title[title][name] = (value_range.get("values") or [[]])[0]
+    rows = []
+    for title in titles:
+        cols = by_title[title]
+        # The API trims trailing empty cells, so columns can differ in length.
+        height = max((len(v) for v in cols.values()), default=0)
+        for i in range(height):
+            row = {name: (cols[name][i] if i < len(cols.get(name, [])) else "") for name in columns}
+            if any(str(v).strip() for v in row.values()):
+                rows.append(row)
+    return rows
+
+
+def _partition_last_rows(titles: List[str]) -> Dict[str, int]:
+    """Last used sheet row of each partition, from one batched read of the scraped_at_utc column."""
+    if not titles:
+        return {}
+    sh = _handle()["spreadsheet"]
+    ranges = []
+    for title in titles:
+        col = _col_letter(_sheet_headers(title).index("scraped_at_utc") + 1)
+        ranges.append(f"{quote_title(title)}!{col}:{col}")
+    resp = _call_with_backoff(sh.values_batch_get, ranges, params={"majorDimension": "COLUMNS"})
+    return {
+        title: len((vr.get("values") or [[]])[0]) for title, vr in zip(titles, resp.get("valueRanges", []))
+    }
+
+
+def _read_tail(titles: List[str], limit: int) -> List[Dict]:
+    """
+    The last `limit` rows across partitions (oldest first), fetched as tail
+    row ranges: one column read to find where each partition ends (closed
+    partitions take it from the index), then one values_batch_get for just
+    the needed rows.
+    """
+    _read_your_writes()
+    sh = _handle()["spreadsheet"]
+    known = _partition_index().last_rows() if rotation_mode() != "none" else {}
+    ends = dict(known)
+    ends.update(_partition_last_rows([t for t in titles if t not in known]))
+    last_rows = [ends.get(title, 0) for title in titles]
+
+    # Newest partition first; take rows until the limit is covered.
+    wanted = []
+    remaining = limit
+    for title, last_row in reversed(list(zip(titles, last_rows))):
+        if remaining <= 0:
+            break
+        take = min(remaining, max(0, last_row - 1))
+        if take:
+            wanted.insert(0, (title, last_row - take + 1, last_row))
+            remaining -= take
+    if not wanted:
+        return []
+
+    tail_ranges = [
+        f"{quote_title(title)}!A{first}:{_col_letter(len(_sheet_headers(title)))}{last}"
+        for title, first, last in wanted
+    ]
+    resp = _call_with_backoff(sh.values_batch_get, tail_ranges)
+    rows = []
+    for (title, _, _), value_range in zip(wanted, resp.get("valueRanges", [])):
+        headers = _sheet_headers(title)
+        for raw in value_range.get("values", []):
+            if not any((cell or "").strip() for cell in raw):
+                continue
+            raw = raw + [""] * (len(headers) - len(raw))
+            rows.append({headers[i]: raw[i] for i in range(len(headers))})
+    return rows[-limit:]
+
+
+def _to_int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
 def get_subreddits(query: Optional[str] = None) -> List[str]:
-    rows = _all_rows()
+    # The mirror already serves full rows locally; otherwise fetch one column.
+    rows = _all_rows() if mirror_enabled() else _read_columns(_partitions(), ["subreddit"])
     seen = set()
     out = []
     for row in rows:
@@ -253,26 +657,31 @@ def get_subreddits(query: Optional[str] = None) -> List[str]:
 
 
 def counts() -> Dict[str, int]:
-    rows = _all_rows()
-    total_comments = 0
-    for r in rows:
-        try:
-            arr = json.loads(r.get("comments_array") or "[]")
-            total_comments += len(arr) if isinstance(arr, list) else 0
-        except Exception:
-            continue
+    if mirror_enabled():
+        return summarize_rows(_all_rows())
+    # The Comments column holds each post's comment count, so the large
+    # text columns never need to be downloaded.
+    rows = _read_columns(_partitions(), ["subreddit", "post_id", "Comments", "scraped_at_utc"])
     return {
         "rows": len(rows),
-        "subreddits": len({r.get("subreddit") for r in rows if r.get("subreddit")}),
-        "posts": len({r.get("post_id") for r in rows if r.get("post_id")}),
-        "comments": total_comments,
+        "subreddits": len({r["subreddit"] for r in rows if r["subreddit"]}),
+        "posts": len({r["post_id"] for r in rows if r["post_id"]}),
+        "comments": sum(_to_int(r["Comments"]) for r in rows if r["post_id"]),
     }
 
 
 def get_recent_rows(limit: int = 50) -> List[Dict]:
-    rows = _all_rows()
     if limit <= 0:
-        return rows
+        return _all_rows()
+    if not mirror_enabled():
+        return _read_tail(_partitions(), limit)
+    _read_your_writes()
+    # Newest partition first; stop as soon as enough rows are collected.
+    rows: List[Dict] = []
+    for title in reversed(_partitions()):
+        rows = _read_partition(title) + rows
+        if len(rows) >= limit:
+            break
     return rows[-limit:]
 
 
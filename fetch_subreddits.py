@@ -1,8 +1,9 @@
 import os
 
-from rag_generation import is_realestate_us
+from rag_generation import classify_realestate_us_batch
+from relevance_cascade import cascade_classify, format_tier_stats
 from scraper_utils import safe_get_json
-from excel_storage import append_subreddits, get_subreddits
+from storage import append_subreddits, get_subreddits
 
 def _basic_realestate_filter(text: str) -> bool:
     text_l = (text or "").lower()
@@ -33,13 +34,25 @@ def get_related_subreddits(query="realestate", limit=11, save_to_sheet=True):
     subreddits = []
     subreddit_records = []
     use_openai_filter = bool(os.getenv("OPENAI_API_KEY"))
-    for sub in data["data"]["children"]:
+    children = data["data"]["children"]
+    texts = [
+        f"{sub['data']['display_name']} {sub['data'].get('title', '')} {sub['data'].get('public_description', '')}"
+        for sub in children
+    ]
+    # Keywords and embeddings settle clear cases locally; only ambiguous
+    # subreddits reach the (batched) LLM, or the basic filter without a key.
+    matches, tier_stats = cascade_classify(
+        texts,
+        llm=classify_realestate_us_batch if use_openai_filter else None,
+        fallback=_basic_realestate_filter,
+        keyword_negatives=False,
+    )
+    print(format_tier_stats(tier_stats))
+    for sub, is_match in zip(children, matches):
         name = sub["data"]["display_name"]
         title = sub["data"].get("title", "")
         description = sub["data"].get("public_description", "")
 
-        text_to_check = f"{name} {title} {description}"
-        is_match = is_realestate_us(text_to_check) if use_openai_filter else _basic_realestate_filter(text_to_check)
         if is_match:
             subreddits.append(name)
             subreddit_records.append(
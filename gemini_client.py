@@ -1,78 +1,308 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
 
+from run_metrics import incr
 
-def generate_text_with_gemini(api_key: str, prompt: str, model: str = "gemini-1.5-flash"):
-    if not api_key.strip():
-        raise ValueError("Missing GEMINI_API_KEY")
 
-    payload = {
-        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.6,
-            "maxOutputTokens": 8192,
-        },
-    }
-
-    def _normalize_model_name(m: str) -> str:
-        m = (m or "").strip()
-        return m.replace("models/", "")
-
-    def _list_generate_models() -> list[str]:
-        url = "https://generativelanguage.googleapis.com/v1beta/models"
-        headers = {"x-goog-api-key": api_key}
-        resp = requests.get(url, headers=headers, timeout=60)
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# Tried after the requested model 404s, before falling back to discovery.
+FALLBACK_MODELS = [
+    "gemini-2.5-flash",
+    "gemini-2.0-flash",
+    "gemini-1.5-flash",
+    "gemini-1.5-pro",
+]
+
+
+DEFAULT_GENERATION_CONFIG = {"temperature": 0.6, "maxOutputTokens": 8192}
+
+# Smallest prefix (in tokens) each model family accepts for explicit caching;
+# anything else is assumed to need the older 32k minimum.
+PREFIX_CACHE_MIN_TOKENS = {
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+_DEFAULT_PREFIX_CACHE_MIN_TOKENS = 32768
+
+
+def _normalize_model_name(m: str) -> str:
+    m = (m or "").strip()
+    return m.replace("models/", "")
+
+
+class GeminiClient:
+    """
+    Reusable Gemini client. Keeps a pooled HTTP session, remembers which
+    model actually served each requested model name, and only lists models
+    (cached for models_ttl_sec) after a generation call returned 404.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, models_ttl_sec: Optional[float] = None):
+        if not api_key.strip():
+            raise ValueError("Missing GEMINI_API_KEY")
+        self.api_key = api_key
+        self.base_url = (base_url or os.getenv("GEMINI_API_BASE", DEFAULT_API_BASE)).rstrip("/")
+        self.models_ttl_sec = (
+            models_ttl_sec if models_ttl_sec is not None else float(os.getenv("GEMINI_MODELS_TTL_SEC", "3600"))
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+        self.session.headers.update({"x-goog-api-key": api_key})
+        self._lock = threading.Lock()
+        self._resolved: Dict[str, str] = {}
+        self._discovered: List[str] = []
+        self._discovered_at = 0.0
+        # (model, prefix sha256) -> (cachedContents name or None if unavailable, expiry)
+        self._prefixes: Dict[tuple, tuple] = {}
+        self._prefix_locks: Dict[tuple, threading.Lock] = {}
+
+    def list_generate_models(self, force: bool = False) -> List[str]:
+        with self._lock:
+            fresh = self._discovered and time.monotonic() - self._discovered_at < self.models_ttl_sec
+            if fresh and not force:
+                return list(self._discovered)
+        resp = self.session.get(f"{self.base_url}/models", timeout=60)
         resp.raise_for_status()
-        data = resp.json()
         models = []
-        for item in data.get("models", []):
+        for item in resp.json().get("models", []):
             methods = item.get("supportedGenerationMethods", []) or []
             if "generateContent" in methods:
-                name = item.get("name", "")
-                if name.startswith("models/"):
-                    name = name.split("/", 1)[1]
+                name = _normalize_model_name(item.get("name", ""))
                 if name:
                     models.append(name)
-        return models
-
-    # Try user model first, then modern known models, then discovered models.
-    fallback_models = [
-        "gemini-2.5-flash",
-        "gemini-2.0-flash",
-        "gemini-1.5-flash",
-        "gemini-1.5-pro",
-    ]
-    discovered = []
-    try:
-        discovered = _list_generate_models()
-    except Exception:
-        discovered = []
-
-    models_to_try = []
-    for m in [_normalize_model_name(model)] + fallback_models + discovered:
-        m = _normalize_model_name(m)
-        if m and m not in models_to_try:
-            models_to_try.append(m)
-
-    last_error = None
-    for m in models_to_try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{m}:generateContent"
-        headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+        with self._lock:
+            self._discovered = models
+            self._discovered_at = time.monotonic()
+        return list(models)
+
+    def _candidates(self, requested: str):
+        """Models to try, in order; discovery runs only if the earlier ones 404."""
+        tried = []
+        with self._lock:
+            sticky = self._resolved.get(requested)
+        for m in [sticky, requested] + FALLBACK_MODELS:
+            m = _normalize_model_name(m or "")
+            if m and m not in tried:
+                tried.append(m)
+                yield m
+        try:
+            discovered = self.list_generate_models()
+        except Exception:
+            discovered = []
+        for m in discovered:
+            if m not in tried:
+                tried.append(m)
+                yield m
+
+    def _generate_with(self, model: str, payload: Dict) -> str:
+        resp = self.session.post(f"{self.base_url}/models/{model}:generateContent", json=payload, timeout=120)
+        resp.raise_for_status()
+        candidates = resp.json().get("candidates", [])
+        if not candidates:
+            return ""
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(p.get("text", "") for p in parts if p.get("text"))
+
+    def _open_stream(self, model: str, payload: Dict) -> requests.Response:
+        resp = self.session.post(
+            f"{self.base_url}/models/{model}:streamGenerateContent",
+            params={"alt": "sse"},
+            json=payload,
+            timeout=120,
+            stream=True,
+        )
         try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=120)
             resp.raise_for_status()
-            data = resp.json()
-            candidates = data.get("candidates", [])
-            if not candidates:
-                return ""
-            parts = candidates[0].get("content", {}).get("parts", [])
-            return "".join(p.get("text", "") for p in parts if p.get("text"))
-        except requests.HTTPError as e:
-            last_error = e
-            # 404 often means invalid/unsupported model; try next model.
-            if getattr(e.response, "status_code", None) == 404:
-                continue
+        except requests.HTTPError:
+            resp.close()
             raise
+        return resp
+
+    @staticmethod
+    def _iter_sse_text(resp: requests.Response) -> Iterator[str]:
+        # SSE is always UTF-8, but text/event-stream comes without a charset
+        # and requests would fall back to ISO-8859-1; decode each line here.
+        with resp:
+            for raw in resp.iter_lines():
+                line = raw.decode("utf-8")
+                if not line or not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[len("data:"):].strip())
+                for candidate in chunk.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+
+    def _payload(self, prompt: str, generation_config: Optional[Dict]) -> Dict:
+        return {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": generation_config or DEFAULT_GENERATION_CONFIG,
+        }
 
-    raise RuntimeError(
-        f"No valid Gemini model found. Tried: {', '.join(models_to_try)}. Last error: {last_error}"
-    )
+    @staticmethod
+    def _prefix_min_tokens(model: str) -> int:
+        override = os.getenv("GEMINI_PREFIX_CACHE_MIN_TOKENS", "").strip()
+        if override:
+            return int(override)
+        for family, minimum in PREFIX_CACHE_MIN_TOKENS.items():
+            if model.startswith(family):
+                return minimum
+        return _DEFAULT_PREFIX_CACHE_MIN_TOKENS
+
+    def prefix_handle(self, prefix: str, model: str) -> Optional[str]:
+        """
+        cachedContents name holding `prefix` for `model`, created on first use
+        with a TTL of GEMINI_PREFIX_CACHE_TTL_SEC. Returns None when caching is
+        off, the prefix is below the model's minimum cacheable size, or the API
+        refused it; a refusal is remembered for the TTL too, so callers inline
+        the prefix. Creation is serialized per (model, prefix), so concurrent
+        workers share one handle instead of each creating their own.
+        """
+        if os.getenv("GEMINI_PREFIX_CACHE", "1").strip().lower() in ("0", "false", "no"):
+            return None
+        # Rough count (4 chars per token); too-small prefixes skip the create-and-fail round trip.
+        if len(prefix) // 4 < self._prefix_min_tokens(model):
+            return None
+        ttl = float(os.getenv("GEMINI_PREFIX_CACHE_TTL_SEC", "3600"))
+        key = (model, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+        with self._lock:
+            create_lock = self._prefix_locks.setdefault(key, threading.Lock())
+        with create_lock:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._prefixes.get(key)
+            # Renew a minute early so a handle never expires mid-request.
+            if entry and now < entry[1] - 60:
+                return entry[0]
+            name = None
+            try:
+                resp = self.session.post(
+                    f"{self.base_url}/cachedContents",
+                    json={
+                        "model": f"models/{model}",
+                        "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+                        "ttl": f"{int(ttl)}s",
+                    },
+                    timeout=60,
+                )
+                resp.raise_for_status()
+                name = resp.json().get("name")
+                incr("gemini_prefix_caches_created")
+            except Exception as e:
+                print(f"Gemini prefix caching unavailable for {model}: {e}")
+            with self._lock:
+                self._prefixes[key] = (name, now + ttl)
+            return name
+
+    def _drop_prefix(self, prefix: str, model: str) -> None:
+        key = (model, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+        with self._lock:
+            self._prefixes.pop(key, None)
+
+    def _call_with_prefix(self, call, model: str, prompt: str, prefix: Optional[str], generation_config: Optional[Dict]):
+        if prefix:
+            handle = self.prefix_handle(prefix, model)
+            if handle:
+                payload = {**self._payload(prompt, generation_config), "cachedContent": handle}
+                try:
+                    result = call(model, payload)
+                    incr("gemini_prefix_cache_uses")
+                    return result
+                except requests.HTTPError as e:
+                    # Expired/evicted handle or a model without caching: send it inline.
+                    if getattr(e.response, "status_code", None) not in (400, 403, 404):
+                        raise
+                    self._drop_prefix(prefix, model)
+            prompt = f"{prefix}\n\n{prompt}"
+        return call(model, self._payload(prompt, generation_config))
+
+    def generate(
+        self,
+        prompt: str,
+        model: str = "gemini-1.5-flash",
+        generation_config: Optional[Dict] = None,
+        prefix: Optional[str] = None,
+    ) -> str:
+        """
+        Generate text for prompt. A static prefix (e.g. the shared
+        instructions) is sent through a cached-content handle when possible,
+        otherwise prepended to the prompt.
+        """
+        return self._with_model(
+            model, lambda m: self._call_with_prefix(self._generate_with, m, prompt, prefix, generation_config)
+        )
+
+    def stream(
+        self,
+        prompt: str,
+        model: str = "gemini-1.5-flash",
+        generation_config: Optional[Dict] = None,
+        prefix: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Yield text chunks as streamGenerateContent (SSE) produces them. Model
+        fallback happens when the stream is opened, before the first chunk.
+        """
+        resp = self._with_model(
+            model, lambda m: self._call_with_prefix(self._open_stream, m, prompt, prefix, generation_config)
+        )
+        yield from self._iter_sse_text(resp)
+
+    def _with_model(self, model: str, call):
+        """Run call(model_name) on the first model that does not 404."""
+        requested = _normalize_model_name(model)
+        tried = []
+        last_error = None
+        for m in self._candidates(requested):
+            tried.append(m)
+            try:
+                result = call(m)
+            except requests.HTTPError as e:
+                last_error = e
+                # 404 often means invalid/unsupported model; try next model.
+                if getattr(e.response, "status_code", None) == 404:
+                    with self._lock:
+                        if self._resolved.get(requested) == m:
+                            del self._resolved[requested]
+                    continue
+                raise
+            with self._lock:
+                self._resolved[requested] = m
+            return result
+
+        raise RuntimeError(f"No valid Gemini model found. Tried: {', '.join(tried)}. Last error: {last_error}")
+
+
+_CLIENTS: Dict[tuple, GeminiClient] = globals().get("_CLIENTS", {})
+_CLIENTS_LOCK = globals().get("_CLIENTS_LOCK") or threading.Lock()
+
+
+def get_client(api_key: str) -> GeminiClient:
+    """Process-wide client per API key, so caches survive across calls and reruns."""
+    key = (api_key, os.getenv("GEMINI_API_BASE", DEFAULT_API_BASE))
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = GeminiClient(api_key)
+            _CLIENTS[key] = client
+        return client
+
+
+def generate_text_with_gemini(api_key: str, prompt: str, model: str = "gemini-1.5-flash"):
+    if not api_key.strip():
+        raise ValueError("Missing GEMINI_API_KEY")
+    return get_client(api_key).generate(prompt, model=model)
+
+
+def stream_text_with_gemini(api_key: str, prompt: str, model: str = "gemini-1.5-flash") -> Iterator[str]:
+    if not api_key.strip():
+        raise ValueError("Missing GEMINI_API_KEY")
+    return get_client(api_key).stream(prompt, model=model)
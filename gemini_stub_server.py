@@ -0,0 +1,170 @@
+"""
+Local stand-in for the Gemini REST API, for exercising gemini_client without
+a key or quota:
+
+    python gemini_stub_server.py --port 8765
+    GEMINI_API_BASE=http://127.0.0.1:8765/v1beta streamlit run streamlit_app.py
+
+Implements models.list, generateContent, streamGenerateContent (alt=sse) and
+cachedContents.create. Answers are deterministic descriptions of the request,
+and JSON-mode requests get an object keyed by the post_ids in the dataset.
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class StubState:
+    def __init__(self, models, min_cache_tokens: int, fail_every: int, delay: float):
+        self.models = models
+        self.min_cache_tokens = min_cache_tokens
+        self.fail_every = fail_every
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.cached = {}
+        self.calls = 0
+
+
+def _request_text(body) -> str:
+    return "\n".join(
+        part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+    )
+
+
+def _answer(state: StubState, model: str, body) -> str:
+    prompt = _request_text(body)
+    prefix = ""
+    if body.get("cachedContent"):
+        prefix = state.cached[body["cachedContent"]][0]
+    config = body.get("generationConfig") or {}
+    if config.get("responseMimeType") == "application/json":
+        ids = re.findall(r'"post_id":"([^"]+)"', prompt)
+        return json.dumps({post_id: f"Stub scripts for post {post_id} from {model}." for post_id in ids})
+    return (
+        f"Stub answer from {model}.\n"
+        f"Cached prefix: {len(prefix)} chars. Prompt: {len(prompt)} chars.\n"
+        f"Prompt starts: {prompt[:80]!r}"
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+
+    def log_message(self, fmt, *args):
+        print(f"[gemini-stub] {self.command} {self.path} -> {fmt % args}")
+
+    def _send_json(self, status: int, payload) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": {"code": status, "message": message}})
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.endswith("/models"):
+            models = [
+                {"name": f"models/{m}", "supportedGenerationMethods": ["generateContent", "createCachedContent"]}
+                for m in self.state.models
+            ]
+            return self._send_json(200, {"models": models})
+        self._error(404, f"Unknown path {path}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._error(400, "Invalid JSON body")
+
+        if url.path.endswith("/cachedContents"):
+            return self._create_cache(body)
+
+        match = re.search(r"/models/([^/:]+):(generateContent|streamGenerateContent)$", url.path)
+        if not match:
+            return self._error(404, f"Unknown path {url.path}")
+        model, method = match.groups()
+        if model not in self.state.models:
+            return self._error(404, f"models/{model} is not found")
+        with self.state.lock:
+            self.state.calls += 1
+            throttled = self.state.fail_every and self.state.calls % self.state.fail_every == 0
+            handle = body.get("cachedContent")
+            entry = self.state.cached.get(handle) if handle else None
+        if throttled:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if handle and (entry is None or entry[1] < time.time()):
+            return self._error(404, f"CachedContent not found: {handle}")
+        if handle and entry[2] != model:
+            return self._error(400, "Model does not match the cached content")
+
+        time.sleep(self.state.delay)
+        text = _answer(self.state, model, body)
+        if method == "generateContent":
+            return self._send_json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+        self._stream(text)
+
+    def _stream(self, text: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(0, len(text), 24):
+            chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[i : i + 24]}]}}]}
+            # Raw UTF-8 and no charset in Content-Type, as the real API sends.
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(min(self.state.delay, 0.05))
+        self.close_connection = True
+
+    def _create_cache(self, body) -> None:
+        model = (body.get("model") or "").replace("models/", "")
+        if model not in self.state.models:
+            return self._error(404, f"models/{model} is not found")
+        text = _request_text(body)
+        if len(text) // 4 < self.state.min_cache_tokens:
+            return self._error(400, f"Cached content is too small; minimum is {self.state.min_cache_tokens} tokens")
+        ttl = float(str(body.get("ttl") or "3600s").rstrip("s"))
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        with self.state.lock:
+            self.state.cached[name] = (text, time.time() + ttl, model)
+        self._send_json(200, {"name": name, "model": f"models/{model}", "ttl": f"{int(ttl)}s"})
+
+
+def serve(host: str, port: int, state: StubState) -> ThreadingHTTPServer:
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Gemini API stand-in for testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--models", default="gemini-2.5-flash,gemini-2.0-flash,gemini-1.5-flash")
+    parser.add_argument("--min-cache-tokens", type=int, default=1024, help="Smaller prefixes are refused (HTTP 400).")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth generation with HTTP 429.")
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds to wait before answering.")
+    args = parser.parse_args()
+    state = StubState(
+        [m.strip() for m in args.models.split(",") if m.strip()],
+        args.min_cache_tokens,
+        args.fail_every,
+        args.delay,
+    )
+    server = serve(args.host, args.port, state)
+    print(f"Gemini stub listening on http://{args.host}:{args.port}/v1beta")
+    server.serve_forever()
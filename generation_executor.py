@@ -0,0 +1,229 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+
+from gemini_client import DEFAULT_GENERATION_CONFIG, get_client
+from prompt_cache import cache_enabled, cache_key, get_cache
+from rate_limit import RateLimiter
+from run_metrics import incr
+
+
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+_LIMITERS: Dict[str, RateLimiter] = globals().get("_LIMITERS", {})
+_LIMITERS_LOCK = globals().get("_LIMITERS_LOCK") or threading.Lock()
+
+
+def _limiter(api_key: str) -> RateLimiter:
+    # One limiter per API key, shared by every run in the process.
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(api_key)
+        if limiter is None:
+            limiter = RateLimiter(float(os.getenv("GEMINI_REQUESTS_PER_MIN", "60")))
+            _LIMITERS[api_key] = limiter
+        return limiter
+
+
+def _retry_delay(error: requests.HTTPError, attempt: int, backoff: float) -> float:
+    headers = error.response.headers if error.response is not None else {}
+    retry_after = headers.get("Retry-After")
+    try:
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        return backoff * (2 ** attempt)
+
+
+def _full_prompt(prompt: str, prefix: Optional[str]) -> str:
+    return f"{prefix}\n\n{prompt}" if prefix else prompt
+
+
+def generate_with_retry(
+    api_key: str,
+    prompt: str,
+    model: str,
+    max_retries: Optional[int] = None,
+    backoff: Optional[float] = None,
+    force: bool = False,
+    generation_config: Optional[Dict] = None,
+    prefix: Optional[str] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """
+    One rate-limited generation, retrying 429/5xx and connection errors.
+    Answers come from the on-disk prompt cache when possible; force skips
+    the lookup but still refreshes the cached entry. prefix is the static
+    part of the prompt (see GeminiClient.generate). With validate, only
+    answers it accepts are cached or served from the cache.
+    """
+    generation_config = generation_config or DEFAULT_GENERATION_CONFIG
+    key = cache_key(model, generation_config, _full_prompt(prompt, prefix)) if cache_enabled() else None
+    if key and not force:
+        cached = get_cache().get(key)
+        if cached is not None and (validate is None or validate(cached)):
+            incr("gemini_cache_hits")
+            return cached
+    text = _generate_uncached(api_key, prompt, model, max_retries, backoff, generation_config, prefix)
+    if key:
+        incr("gemini_cache_misses")
+        # Empty answers (e.g. blocked candidates) are worth retrying later.
+        if text and (validate is None or validate(text)):
+            get_cache().put(key, model, text)
+    return text
+
+
+def _generate_uncached(
+    api_key: str,
+    prompt: str,
+    model: str,
+    max_retries: Optional[int],
+    backoff: Optional[float],
+    generation_config: Dict,
+    prefix: Optional[str] = None,
+) -> str:
+    max_retries = max_retries or int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+    backoff = backoff if backoff is not None else float(os.getenv("GEMINI_BACKOFF_BASE_SEC", "2"))
+    client = get_client(api_key)
+    for attempt in range(max_retries):
+        _limiter(api_key).acquire()
+        try:
+            return client.generate(prompt, model=model, generation_config=generation_config, prefix=prefix)
+        except requests.HTTPError as e:
+            status = getattr(e.response, "status_code", None)
+            if status not in _RETRY_STATUSES or attempt == max_retries - 1:
+                raise
+            incr("gemini_retries")
+            time.sleep(_retry_delay(e, attempt, backoff))
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries - 1:
+                raise
+            incr("gemini_retries")
+            time.sleep(backoff * (2 ** attempt))
+    raise RuntimeError("Gemini generation retries exhausted")
+
+
+def stream_with_retry(
+    api_key: str,
+    prompt: str,
+    model: str,
+    max_retries: Optional[int] = None,
+    backoff: Optional[float] = None,
+    force: bool = False,
+    prefix: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of generate_with_retry: yields text chunks as they
+    arrive. A cache hit yields the whole answer at once. Failures are only
+    retried before the first chunk, so output is never repeated.
+    """
+    key = cache_key(model, DEFAULT_GENERATION_CONFIG, _full_prompt(prompt, prefix)) if cache_enabled() else None
+    if key and not force:
+        cached = get_cache().get(key)
+        if cached is not None:
+            incr("gemini_cache_hits")
+            yield cached
+            return
+    max_retries = max_retries or int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+    backoff = backoff if backoff is not None else float(os.getenv("GEMINI_BACKOFF_BASE_SEC", "2"))
+    client = get_client(api_key)
+    chunks: List[str] = []
+    for attempt in range(max_retries):
+        _limiter(api_key).acquire()
+        try:
+            for chunk in client.stream(prompt, model=model, prefix=prefix):
+                chunks.append(chunk)
+                yield chunk
+            break
+        except requests.HTTPError as e:
+            status = getattr(e.response, "status_code", None)
+            if chunks or status not in _RETRY_STATUSES or attempt == max_retries - 1:
+                raise
+            incr("gemini_retries")
+            time.sleep(_retry_delay(e, attempt, backoff))
+        except (requests.ConnectionError, requests.Timeout):
+            if chunks or attempt == max_retries - 1:
+                raise
+            incr("gemini_retries")
+            time.sleep(backoff * (2 ** attempt))
+    text = "".join(chunks)
+    if key:
+        incr("gemini_cache_misses")
+        if text:
+            get_cache().put(key, model, text)
+
+
+def generate_many(
+    api_key: str,
+    prompts: List[str],
+    model: str,
+    max_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    force: bool = False,
+    prefix: Optional[str] = None,
+) -> List[Union[str, Exception]]:
+    """
+    Generate for every prompt on a bounded thread pool. Results come back in
+    prompt order; a failed prompt yields its exception instead of a string.
+    on_progress(done, total) runs on the calling thread as each one finishes,
+    so it can safely update Streamlit widgets.
+    """
+    max_workers = max_workers or int(os.getenv("GEMINI_MAX_WORKERS", "4"))
+    results: List[Union[str, Exception]] = [""] * len(prompts)
+    if not prompts:
+        return results
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini") as pool:
+        futures = {pool.submit(generate_with_retry, api_key, prompt, model, force=force, prefix=prefix): i for i, prompt in enumerate(prompts)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+            if on_progress:
+                on_progress(done, len(prompts))
+    return results
+
+
+def stream_many(
+    api_key: str,
+    prompts: List[str],
+    model: str,
+    max_workers: Optional[int] = None,
+    force: bool = False,
+    prefix: Optional[str] = None,
+) -> Iterator[Tuple[int, Optional[str], Optional[Union[str, Exception]]]]:
+    """
+    Streaming counterpart of generate_many: prompts stream concurrently on a
+    bounded pool while the calling thread iterates the events workers put on
+    a queue, so it can update Streamlit widgets. Yields (index, chunk, None)
+    for each chunk, then (index, None, result) once that prompt is done,
+    with the full text or the exception it failed with.
+    """
+    max_workers = max_workers or int(os.getenv("GEMINI_MAX_WORKERS", "4"))
+    events: "queue.Queue" = queue.Queue()
+
+    def run(i: int, prompt: str) -> None:
+        text = ""
+        try:
+            for chunk in stream_with_retry(api_key, prompt, model, force=force, prefix=prefix):
+                text += chunk
+                events.put((i, chunk, None))
+            events.put((i, None, text))
+        except Exception as e:
+            events.put((i, None, e))
+
+    if not prompts:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-stream") as pool:
+        for i, prompt in enumerate(prompts):
+            pool.submit(run, i, prompt)
+        remaining = len(prompts)
+        while remaining:
+            event = events.get()
+            if event[1] is None:
+                remaining -= 1
+            yield event
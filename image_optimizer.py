@@ -0,0 +1,111 @@
+import os
+from typing import Dict, Optional
+
+
+_EXTENSIONS = {"png": ".png", "webp": ".webp", "avif": ".avif"}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _settings(output_format, quality, colors, max_dim) -> Dict:
+    # Read at call time so deployed secrets/env updates are always respected.
+    fmt = (output_format or os.getenv("IMG_OPT_FORMAT", "png")).strip().lower()
+    if fmt not in _EXTENSIONS:
+        fmt = "png"
+    return {
+        "format": fmt,
+        "quality": quality if quality is not None else _env_int("IMG_OPT_QUALITY", 80),
+        "colors": colors if colors is not None else _env_int("IMG_OPT_COLORS", 256),
+        "max_dim": max_dim if max_dim is not None else _env_int("IMG_OPT_MAX_DIM", 2400),
+    }
+
+
+def _avif_supported() -> bool:
+    try:
+        from PIL import features
+
+        if features.check("avif"):
+            return True
+    except Exception:
+        pass
+    try:
+        import pillow_avif  # noqa: F401
+
+        return True
+    except Exception:
+        return False
+
+
+def optimize_image(
+    image_path: str,
+    output_format: Optional[str] = None,
+    quality: Optional[int] = None,
+    colors: Optional[int] = None,
+    max_dim: Optional[int] = None,
+) -> Dict:
+    """
+    Shrink a rendered card before upload: clamp the longest side to max_dim,
+    quantize to a palette (PNG) and optionally re-encode as WebP/AVIF.
+    The original file is kept when the optimized result is not smaller.
+    """
+    bytes_before = os.path.getsize(image_path)
+    result = {
+        "image_path": image_path,
+        "format": os.path.splitext(image_path)[1].lstrip(".").lower() or "png",
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_before,
+        "bytes_saved": 0,
+    }
+    if os.getenv("IMG_OPT_ENABLED", "1").strip().lower() in ("0", "false", "no"):
+        return result
+
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Image optimization skipped: Pillow is not installed.")
+        return result
+
+    opts = _settings(output_format, quality, colors, max_dim)
+    fmt = opts["format"]
+    if fmt == "avif" and not _avif_supported():
+        print("AVIF encoder unavailable; falling back to WebP.")
+        fmt = "webp"
+
+    with Image.open(image_path) as src:
+        img = src.convert("RGB")
+    if opts["max_dim"] > 0 and max(img.size) > opts["max_dim"]:
+        img.thumbnail((opts["max_dim"], opts["max_dim"]), Image.LANCZOS)
+
+    out_path = os.path.splitext(image_path)[0] + _EXTENSIONS[fmt]
+    tmp_path = out_path + ".tmp"
+    if fmt == "png":
+        if 0 < opts["colors"] <= 256:
+            img = img.quantize(colors=opts["colors"], method=Image.Quantize.MEDIANCUT)
+        img.save(tmp_path, format="PNG", optimize=True)
+    elif fmt == "webp":
+        img.save(tmp_path, format="WEBP", quality=opts["quality"], method=6)
+    else:
+        img.save(tmp_path, format="AVIF", quality=opts["quality"])
+
+    bytes_after = os.path.getsize(tmp_path)
+    if bytes_after >= bytes_before:
+        os.remove(tmp_path)
+        return result
+
+    os.replace(tmp_path, out_path)
+    if out_path != image_path:
+        os.remove(image_path)
+    result.update(
+        {
+            "image_path": out_path,
+            "format": fmt,
+            "bytes_after": bytes_after,
+            "bytes_saved": bytes_before - bytes_after,
+        }
+    )
+    return result
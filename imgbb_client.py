@@ -1,21 +1,105 @@
-import base64
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+
+UPLOAD_URL = "https://api.imgbb.com/1/upload"
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ImgBBUploader:
+    """
+    Pooled ImgBB uploader. Images are sent as binary multipart (no base64),
+    transient 5xx/429 responses are retried with exponential backoff, and
+    submit() runs uploads on a bounded worker pool.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        max_workers: Optional[int] = None,
+        timeout: int = 45,
+        max_retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        expiration: Optional[int] = None,
+    ):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_workers = max_workers or int(os.getenv("IMGBB_MAX_WORKERS", "4"))
+        self.max_retries = max_retries or int(os.getenv("IMGBB_MAX_RETRIES", "4"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("IMGBB_BACKOFF_BASE_SEC", "1.5"))
+        # Seconds until ImgBB deletes the image; 0 keeps it forever.
+        self.expiration = expiration if expiration is not None else int(os.getenv("IMGBB_EXPIRATION_SEC", "0"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="imgbb")
+
+    def _post(self, image_path: str) -> requests.Response:
+        filename = os.path.basename(image_path)
+        fields = {"key": self.api_key}
+        if self.expiration:
+            fields["expiration"] = str(self.expiration)
+        with open(image_path, "rb") as f:
+            try:
+                from requests_toolbelt import MultipartEncoder
+
+                # Streams the file from disk instead of building the body in memory.
+                encoder = MultipartEncoder(fields={**fields, "image": (filename, f)})
+                return self.session.post(
+                    UPLOAD_URL,
+                    data=encoder,
+                    headers={"Content-Type": encoder.content_type},
+                    timeout=self.timeout,
+                )
+            except ImportError:
+                return self.session.post(
+                    UPLOAD_URL,
+                    data=fields,
+                    files={"image": (filename, f)},
+                    timeout=self.timeout,
+                )
+
+    def upload(self, image_path: str) -> Optional[str]:
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                response = self._post(image_path)
+                if response.status_code in _RETRY_STATUSES:
+                    last_error = RuntimeError(f"HTTP {response.status_code} from ImgBB")
+                else:
+                    response.raise_for_status()
+                    payload = response.json()
+                    if not payload.get("success"):
+                        return None
+                    return payload.get("data", {}).get("url")
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                last_error = exc
+            if attempt < self.max_retries - 1:
+                time.sleep(self.backoff * (2 ** attempt))
+        raise last_error or RuntimeError("ImgBB upload failed.")
+
+    def submit(self, image_path: str) -> Future:
+        return self._executor.submit(self.upload, image_path)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
 
 
 def upload_image_to_imgbb(image_path: str, api_key: str, timeout: int = 45) -> Optional[str]:
-    with open(image_path, "rb") as f:
-        image_b64 = base64.b64encode(f.read()).decode("utf-8")
-
-    url = "https://api.imgbb.com/1/upload"
-    response = requests.post(
-        url,
-        data={"key": api_key, "image": image_b64},
-        timeout=timeout,
-    )
-    response.raise_for_status()
-    payload = response.json()
-    if not payload.get("success"):
-        return None
-    return payload.get("data", {}).get("url")
+    uploader = ImgBBUploader(api_key, max_workers=1, timeout=timeout)
+    try:
+        return uploader.upload(image_path)
+    finally:
+        uploader.shutdown(wait=False)
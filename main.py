@@ -5,40 +5,96 @@ from fetch_comments import fetch_comments
 from fetch_post_url import fetch_post_from_url
 from fetch_posts import fetch_posts
 from html_export import export_post_assets
-from imgbb_client import upload_image_to_imgbb
+from image_optimizer import optimize_image
+from imgbb_client import ImgBBUploader
+from run_metrics import get_run_metrics, incr, record
+from upload_registry import file_digest, get_registry
 
 
-def _store_post_and_upload(post, comments, show_subreddit, imgbb_api_key):
+def _store_post_and_upload(post, comments, show_subreddit, uploader=None):
     assets = export_post_assets(post, comments)
     html_path = assets.get("html_path")
     image_path = assets.get("image_path")
 
-    if imgbb_api_key.strip() and image_path and os.path.exists(image_path):
+    if image_path and os.path.exists(image_path):
         try:
-            post["imgbb_link"] = upload_image_to_imgbb(image_path, imgbb_api_key.strip())
-            print(f"   -> ImgBB: {post['imgbb_link']}")
+            optimized = optimize_image(image_path)
+            image_path = optimized["image_path"]
+            record("image_bytes_saved", {"post_id": post.get("id"), **optimized})
+            incr("image_bytes_saved_total", optimized["bytes_saved"])
+            print(
+                f"   -> Image: {optimized['bytes_before']} -> {optimized['bytes_after']} bytes "
+                f"({optimized['format']})"
+            )
         except Exception as e:
-            post["imgbb_link"] = None
-            print(f"   -> ImgBB upload failed: {e}")
-    else:
-        post["imgbb_link"] = None
+            print(f"   -> Image optimization failed: {e}")
 
+    post["imgbb_link"] = None
     # Always stamp retrieval time for storage and script-generation traceability.
     post["scraped_at_utc"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
-    # Temporary artifacts are deleted after upload.
-    try:
-        if image_path and os.path.exists(image_path):
-            os.remove(image_path)
-        if html_path and os.path.exists(html_path):
-            os.remove(html_path)
-    except Exception:
-        pass
+    if uploader and image_path and os.path.exists(image_path):
+        digest = file_digest(image_path)
+        cached_link = get_registry().lookup(digest)
+        if cached_link:
+            post["imgbb_link"] = cached_link
+            incr("imgbb_uploads_skipped")
+            print(f"   -> ImgBB (already uploaded): {cached_link}")
+            _remove_artifacts([image_path, html_path])
+        else:
+            # Upload runs on the uploader's worker pool; the fetch loop keeps going.
+            future = uploader.submit(image_path)
+            future.add_done_callback(
+                lambda f: _apply_upload_result(post, f, [image_path, html_path], digest, uploader.expiration)
+            )
+    else:
+        _remove_artifacts([image_path, html_path])
 
     # No persistent storage here; caller handles Google Sheets/session storage.
     return post
 
 
+def _apply_upload_result(post, future, artifact_paths, digest, expiration):
+    try:
+        post["imgbb_link"] = future.result()
+        print(f"   -> ImgBB: {post['imgbb_link']}")
+        get_registry().record(digest, post["imgbb_link"], expiration)
+    except Exception as e:
+        post["imgbb_link"] = None
+        print(f"   -> ImgBB upload failed: {e}")
+    finally:
+        _remove_artifacts(artifact_paths)
+
+
+def _remove_artifacts(paths):
+    # Temporary artifacts are deleted after upload.
+    for path in paths:
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except Exception:
+            pass
+
+
+def _make_uploader(imgbb_api_key):
+    if not imgbb_api_key.strip():
+        return None
+    uploader = ImgBBUploader(imgbb_api_key.strip())
+    # The metric is process-wide; remember where this run started counting.
+    uploader.skipped_before = get_run_metrics().get("imgbb_uploads_skipped", 0)
+    return uploader
+
+
+def _finish_uploads(uploader):
+    # Wait for in-flight uploads so every returned post has its final imgbb_link.
+    if not uploader:
+        return
+    uploader.shutdown(wait=True)
+    skipped = get_run_metrics().get("imgbb_uploads_skipped", 0) - uploader.skipped_before
+    if skipped > 0:
+        print(f"Skipped {skipped} ImgBB uploads (identical images already uploaded).")
+
+
 def fetch_for_subreddits(
     subreddits,
     posts_per_subreddit=5,
@@ -47,43 +103,51 @@ def fetch_for_subreddits(
 ):
     """Fetch exactly N top posts per subreddit and M top comments per post."""
     collected = []
-    for subreddit in subreddits:
-        print(f"\nFetching from r/{subreddit} ...")
-        posts = fetch_posts(subreddit, limit=posts_per_subreddit)
-        print(f"Fetched {len(posts)} posts from r/{subreddit}")
-
-        for post_idx, post in enumerate(posts, start=1):
-            post["post_rank"] = post_idx
-            print(f"Inserted Post: {post['title']}")
-            comments = fetch_comments(subreddit, post["id"], limit=comments_per_post)
-            stored = _store_post_and_upload(
-                post=post,
-                comments=comments,
-                show_subreddit=(post_idx == 1),
-                imgbb_api_key=imgbb_api_key,
-            )
-            collected.append({"post": stored, "comments": comments})
-            print(f"   -> {len(comments)} comments fetched for post {post['id']}")
+    uploader = _make_uploader(imgbb_api_key)
+    try:
+        for subreddit in subreddits:
+            print(f"\nFetching from r/{subreddit} ...")
+            posts = fetch_posts(subreddit, limit=posts_per_subreddit)
+            print(f"Fetched {len(posts)} posts from r/{subreddit}")
+
+            for post_idx, post in enumerate(posts, start=1):
+                post["post_rank"] = post_idx
+                print(f"Inserted Post: {post['title']}")
+                comments = fetch_comments(subreddit, post["id"], limit=comments_per_post)
+                stored = _store_post_and_upload(
+                    post=post,
+                    comments=comments,
+                    show_subreddit=(post_idx == 1),
+                    uploader=uploader,
+                )
+                collected.append({"post": stored, "comments": comments})
+                print(f"   -> {len(comments)} comments fetched for post {post['id']}")
+    finally:
+        _finish_uploads(uploader)
     return collected
 
 
 def fetch_for_post_urls(post_urls, comments_per_post=3, imgbb_api_key=""):
     """Fetch from direct Reddit post links and return collected post/comment data."""
     collected = []
-    for idx, post_url in enumerate(post_urls, start=1):
-        post = fetch_post_from_url(post_url)
-        if not post:
-            print(f"Skipped URL (invalid/excluded/not found): {post_url}")
-            continue
-        post["post_rank"] = idx
-        comments = fetch_comments(post["subreddit"], post["id"], limit=comments_per_post)
-        stored = _store_post_and_upload(
-            post=post,
-            comments=comments,
-            show_subreddit=True,
-            imgbb_api_key=imgbb_api_key,
-        )
-        collected.append({"post": stored, "comments": comments, "post_url": post_url})
+    uploader = _make_uploader(imgbb_api_key)
+    try:
+        for idx, post_url in enumerate(post_urls, start=1):
+            post = fetch_post_from_url(post_url)
+            if not post:
+                print(f"Skipped URL (invalid/excluded/not found): {post_url}")
+                continue
+            post["post_rank"] = idx
+            comments = fetch_comments(post["subreddit"], post["id"], limit=comments_per_post)
+            stored = _store_post_and_upload(
+                post=post,
+                comments=comments,
+                show_subreddit=True,
+                uploader=uploader,
+            )
+            collected.append({"post": stored, "comments": comments, "post_url": post_url})
+    finally:
+        _finish_uploads(uploader)
     return collected
 
 
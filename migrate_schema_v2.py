@@ -0,0 +1,86 @@
+import argparse
+import time
+
+import gspread
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import excel_storage  # noqa: E402  (reads GOOGLE_SHEET_ID at import)
+from comments_codec import decode_comments, encode_comments  # noqa: E402
+from storage_schema import HEADERS, HEADERS_V1  # noqa: E402
+
+
+def _to_v2(raw):
+    raw = list(raw) + [""] * (len(HEADERS_V1) - len(raw))
+    row = dict(zip(HEADERS_V1, raw))
+    if row.get("comments_array") or row.get("post_id"):
+        row["comments_array"] = encode_comments(decode_comments(row.get("comments_array")))
+    return [row.get(h, "") for h in HEADERS]
+
+
+def _target_worksheet(sh, title):
+    try:
+        return sh.worksheet(title)
+    except gspread.WorksheetNotFound:
+        ws = sh.add_worksheet(title=title, rows=1000, cols=len(HEADERS) + 5)
+        ws.update("A1", [HEADERS])
+        return ws
+
+
+def migrate(chunk_size=500):
+    """
+    Stream the v1 worksheet into a v2 copy chunk by chunk, then swap names.
+    Safe to re-run after an interruption: rows already in the copy are skipped.
+    """
+    sh = excel_storage._handle()["spreadsheet"]
+    name = excel_storage.WORKSHEET_NAME
+    src = sh.worksheet(name)
+    header = src.row_values(1)
+    if header == HEADERS:
+        print(f"Worksheet '{name}' already uses schema v2.")
+        return
+    if header != HEADERS_V1:
+        raise RuntimeError(f"Worksheet '{name}' has an unknown header; refusing to migrate.")
+
+    target = _target_worksheet(sh, f"{name}_v2_migration")
+    # scraped_at_utc is set on every written row, so it counts migrated rows.
+    already_done = max(0, len(target.col_values(HEADERS.index("scraped_at_utc") + 1)) - 1)
+    last_col = gspread.utils.rowcol_to_a1(1, len(HEADERS_V1)).rstrip("1")
+
+    # Bounded by the grid (fetched just above with the worksheet): once append_rows
+    # has grown a sheet, it ends at the last data row and reading past it errors.
+    last_row = src.row_count
+    seen = 0
+    migrated = 0
+    start = 2
+    while start <= last_row:
+        end = min(start + chunk_size - 1, last_row)
+        chunk = src.get(f"A{start}:{last_col}{end}")
+        out = []
+        for raw in chunk:
+            if not any((cell or "").strip() for cell in raw):
+                continue
+            seen += 1
+            if seen <= already_done:
+                continue
+            out.append(_to_v2(raw))
+        if out:
+            target.append_rows(out, value_input_option="USER_ENTERED")
+            migrated += len(out)
+        print(f"Rows {start}-{end}: migrated {len(out)}")
+        start = end + 1
+
+    backup_title = f"{name}_v1_backup_{time.strftime('%Y%m%d%H%M%S')}"
+    src.update_title(backup_title)
+    target.update_title(name)
+    excel_storage.reset_worksheet_cache()
+    print(f"Migrated {migrated} rows ({already_done} from a previous run). Old sheet kept as '{backup_title}'.")
+    print("Restart running app processes so they pick up the new worksheet.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the scraped_data worksheet to schema v2.")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+    migrate(chunk_size=args.chunk_size)
@@ -0,0 +1,299 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from comments_codec import decode_comments
+
+
+STATE_FILE = "_export_state.json"
+
+# Partition keys of both tables (hive layout: subreddit=<name>/date=YYYY-MM-DD).
+PARTITION_COLS = ["subreddit", "date"]
+
+POST_FIELDS = [
+    ("post_id", "string"),
+    ("post_rank", "int64"),
+    ("post_title", "string"),
+    ("post_selftext", "string"),
+    ("post_url", "string"),
+    ("post_flair", "string"),
+    ("author", "string"),
+    ("posted_on", "timestamp"),
+    ("likes", "int64"),
+    ("post_num_comments", "int64"),
+    ("post_upvote_ratio", "float64"),
+    ("post_age_days", "float64"),
+    ("comment_count", "int64"),
+    ("imgbb_link", "string"),
+    ("scraped_at_utc", "timestamp"),
+    ("exported_at", "timestamp"),
+]
+
+COMMENT_FIELDS = [
+    ("post_id", "string"),
+    ("comment_id", "string"),
+    ("author", "string"),
+    ("body", "string"),
+    ("ups", "int64"),
+    ("url", "string"),
+    ("created_utc", "timestamp"),
+    ("exported_at", "timestamp"),
+]
+
+
+def export_dir() -> str:
+    return os.getenv("PARQUET_EXPORT_DIR", os.path.join("exports", "parquet"))
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow).") from e
+    return pa, pq
+
+
+def _schema(fields: List[Tuple[str, str]]):
+    pa, _ = _pyarrow()
+    types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in fields])
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _str(value) -> Optional[str]:
+    return None if value in (None, "") else str(value)
+
+
+def _partition_dir(root: str, table: str, subreddit: str, date: str) -> str:
+    safe_sub = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in subreddit) or "unknown"
+    return os.path.join(root, table, f"subreddit={safe_sub}", f"date={date}")
+
+
+def split_rows(rows: Iterable[Dict], exported_at: datetime) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Turn storage rows into (posts, comments) records. Sheet rows only repeat
+    the subreddit on a block's first row, so it is carried forward in row order.
+    """
+    posts = []
+    comments = []
+    current_subreddit = ""
+    for row in rows:
+        if row.get("subreddit"):
+            current_subreddit = str(row["subreddit"])
+        post_id = _str(row.get("post_id"))
+        if not post_id:
+            continue
+        posted_on = _parse_ts(row.get("posted on"))
+        scraped_at = _parse_ts(row.get("scraped_at_utc"))
+        date = (posted_on or scraped_at or exported_at).strftime("%Y-%m-%d")
+        subreddit = current_subreddit or "unknown"
+        decoded = decode_comments(row.get("comments_array"))
+        posts.append(
+            {
+                "subreddit": subreddit,
+                "date": date,
+                "post_id": post_id,
+                "post_rank": _int(row.get("post_rank")),
+                "post_title": _str(row.get("post_title")),
+                "post_selftext": _str(row.get("post_selftext")),
+                "post_url": _str(row.get("post_url")),
+                "post_flair": _str(row.get("post_flair")),
+                "author": _str(row.get("author")),
+                "posted_on": posted_on,
+                "likes": _int(row.get("likes")),
+                "post_num_comments": _int(row.get("post_num_comments")),
+                "post_upvote_ratio": _float(row.get("post_upvote_ratio")),
+                "post_age_days": _float(row.get("post_age_days")),
+                "comment_count": len(decoded),
+                "imgbb_link": _str(row.get("imgbb_link")),
+                "scraped_at_utc": scraped_at,
+                "exported_at": exported_at,
+            }
+        )
+        for c in decoded:
+            comments.append(
+                {
+                    "subreddit": subreddit,
+                    "date": date,
+                    "post_id": post_id,
+                    "comment_id": _str(c.get("comment_id")),
+                    "author": _str(c.get("author")),
+                    "body": _str(c.get("body")),
+                    "ups": _int(c.get("ups")),
+                    "url": _str(c.get("url")),
+                    "created_utc": _parse_ts(c.get("created_utc")),
+                    "exported_at": exported_at,
+                }
+            )
+    return posts, comments
+
+
+def _fingerprint(row: Dict) -> str:
+    # A re-collected post gets a new scraped_at_utc; comments can change without it.
+    payload = f"{row.get('scraped_at_utc') or ''}|{row.get('comments_array') or ''}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _load_state(root: str) -> Dict:
+    try:
+        with open(os.path.join(root, STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"posts": {}}
+
+
+def _save_state(root: str, state: Dict) -> None:
+    path = os.path.join(root, STATE_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _write_partitions(root: str, table: str, records: List[Dict], fields: List[Tuple[str, str]], part: str) -> int:
+    pa, pq = _pyarrow()
+    schema = _schema(fields)
+    groups: Dict[Tuple[str, str], List[Dict]] = {}
+    for rec in records:
+        groups.setdefault((rec["subreddit"], rec["date"]), []).append(rec)
+    for (subreddit, date), recs in groups.items():
+        out_dir = _partition_dir(root, table, subreddit, date)
+        os.makedirs(out_dir, exist_ok=True)
+        columns = {name: [r.get(name) for r in recs] for name, _ in fields}
+        pq.write_table(
+            pa.Table.from_pydict(columns, schema=schema),
+            os.path.join(out_dir, f"{part}.parquet"),
+            compression="zstd",
+        )
+    return len(groups)
+
+
+def export_rows(rows: Iterable[Dict], root: Optional[str] = None) -> Dict[str, int]:
+    """
+    Append posts and comments that are new or changed since the last export
+    as new Parquet part files. Unchanged posts are skipped using a small
+    state file, so re-running over the full sheet only writes the delta.
+    """
+    root = root or export_dir()
+    os.makedirs(root, exist_ok=True)
+    state = _load_state(root)
+    seen = state.setdefault("posts", {})
+
+    changed = []
+    fingerprints = {}
+    for row in rows:
+        post_id = _str(row.get("post_id"))
+        if post_id:
+            fp = _fingerprint(row)
+            if seen.get(post_id) == fp:
+                if row.get("subreddit"):
+                    # Keep the subreddit for the posts that follow it.
+                    changed.append({"subreddit": row["subreddit"]})
+                continue
+            fingerprints[post_id] = fp
+        # Non-post rows carry the subreddit for the posts after them.
+        changed.append(row)
+
+    exported_at = datetime.now(timezone.utc)
+    posts, comments = split_rows(changed, exported_at)
+    part = f"part-{exported_at.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    files = 0
+    if posts:
+        files += _write_partitions(root, "posts", posts, POST_FIELDS, part)
+    if comments:
+        files += _write_partitions(root, "comments", comments, COMMENT_FIELDS, part)
+    # Record progress only after the files are written, so a crash re-exports.
+    seen.update(fingerprints)
+    state["last_export_at"] = exported_at.isoformat()
+    _save_state(root, state)
+    return {"posts": len(posts), "comments": len(comments), "files": files}
+
+
+def sync_from_storage(root: Optional[str] = None) -> Dict[str, int]:
+    """Incrementally export everything in the configured storage backend."""
+    from storage import get_all_rows
+
+    return export_rows(get_all_rows(), root=root)
+
+
+def read_table(
+    table: str,
+    columns: Optional[List[str]] = None,
+    filters=None,
+    root: Optional[str] = None,
+    latest_only: bool = True,
+):
+    """
+    Read the posts or comments table as a pyarrow Table through memory-mapped
+    files. Only the requested columns are decoded, and partition filters
+    (e.g. [("subreddit", "=", "RealEstate")]) skip whole directories.
+    With latest_only, re-exported posts/comments keep only their newest copy.
+    """
+    pa, pq = _pyarrow()
+    path = os.path.join(root or export_dir(), table)
+    if not os.path.isdir(path):
+        return pa.table({})
+    keys = ["post_id"] if table == "posts" else ["post_id", "comment_id"]
+    wanted = None
+    if columns is not None:
+        wanted = list(dict.fromkeys(list(columns) + (keys + ["exported_at"] if latest_only else [])))
+    result = pq.read_table(path, columns=wanted, filters=filters, memory_map=True, partitioning="hive")
+    if not latest_only or result.num_rows == 0:
+        return result
+    # Keep the row from each key's newest export (vectorized, no Python loop).
+    latest = result.group_by(keys).aggregate([("exported_at", "max")])
+    latest = latest.rename_columns([("exported_at" if n == "exported_at_max" else n) for n in latest.column_names])
+    deduped = result.join(latest, keys=keys + ["exported_at"], join_type="inner")
+    return deduped.select(list(columns)) if columns is not None else deduped
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export scraped rows to partitioned Parquet (incremental).")
+    parser.add_argument("--out", default=None, help="Output directory (default: PARQUET_EXPORT_DIR or exports/parquet)")
+    args = parser.parse_args()
+    started = time.time()
+    stats = sync_from_storage(root=args.out)
+    print(
+        f"Exported {stats['posts']} posts and {stats['comments']} comments "
+        f"into {stats['files']} files in {time.time() - started:.1f}s."
+    )
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+def cache_enabled() -> bool:
+    return os.getenv("GEMINI_CACHE", "1").strip().lower() not in ("0", "false", "no")
+
+
+def cache_key(model: str, generation_config: Dict, prompt: str) -> str:
+    payload = json.dumps([model, generation_config, prompt], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    On-disk cache of generated text keyed by cache_key(). Entries expire
+    after ttl_sec, and once the stored text exceeds max_bytes the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, ttl_sec: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.path = path
+        self.ttl_sec = ttl_sec if ttl_sec is not None else float(os.getenv("GEMINI_CACHE_TTL_SEC", str(7 * 86400)))
+        self.max_bytes = max_bytes or int(float(os.getenv("GEMINI_CACHE_MAX_MB", "100")) * 1024 * 1024)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with conn:
+            if self.ttl_sec > 0 and now - row[1] > self.ttl_sec:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self.ttl_sec > 0:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_sec,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until back under the limit.
+        freed = 0
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used_at"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def stats(self) -> Dict:
+        entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size}
+
+
+_CACHES: Dict[str, PromptCache] = globals().get("_CACHES", {})
+_CACHES_LOCK = globals().get("_CACHES_LOCK") or threading.Lock()
+
+
+def get_cache(path: Optional[str] = None) -> PromptCache:
+    path = path or os.getenv("GEMINI_CACHE_PATH", os.path.join(".cache", "gemini_cache.db"))
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = PromptCache(path)
+            _CACHES[path] = cache
+        return cache
@@ -0,0 +1,66 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+from comments_codec import decode_comments
+
+
+# Comment fields worth sending to the model; ids, urls and timestamps are not.
+COMMENT_FIELDS = ("author", "body", "ups")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for budgeting.
+    return len(text) // 4 + 1
+
+
+def dumps_compact(obj) -> str:
+    """JSON without pretty-print whitespace or \\u escapes."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _ups(comment: Dict) -> float:
+    try:
+        return float(comment.get("ups") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def pack_post(row: Dict, max_tokens: Optional[int] = None) -> Dict:
+    """
+    Compact LLM view of a stored row: comments are decoded once into plain
+    objects (not an escaped JSON string) with only COMMENT_FIELDS. If the
+    packed post is over max_tokens (PROMPT_POST_TOKEN_BUDGET, default 6000),
+    the lowest-upvoted comments are dropped until it fits; the rest keep
+    their thread order.
+    """
+    max_tokens = max_tokens or int(os.getenv("PROMPT_POST_TOKEN_BUDGET", "6000"))
+    comments = [
+        {k: v for k, v in c.items() if v not in (None, "")}
+        for c in decode_comments(row.get("comments_array"), fields=COMMENT_FIELDS)
+    ]
+    packed = {
+        "post_title": row.get("post_title"),
+        "post_selftext": row.get("post_selftext") or "",
+        "Comments": row.get("Comments"),
+        # Same field name the script prompt describes, now a real list.
+        "comments_array": comments,
+    }
+
+    size = estimate_tokens(dumps_compact(packed))
+    if size <= max_tokens:
+        return packed
+    # Drop comments lowest-ups first (ties: later comments first).
+    keep = set(range(len(comments)))
+    for i in sorted(range(len(comments)), key=lambda j: (_ups(comments[j]), -j)):
+        if size <= max_tokens:
+            break
+        keep.discard(i)
+        size -= estimate_tokens(dumps_compact(comments[i])) + 1
+    packed["comments_array"] = [c for i, c in enumerate(comments) if i in keep]
+    packed["comments_trimmed"] = len(comments) - len(keep)
+    return packed
+
+
+def pack_posts(rows: List[Dict], max_tokens: Optional[int] = None) -> List[Dict]:
+    return [pack_post(r, max_tokens=max_tokens) for r in rows]
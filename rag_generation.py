@@ -1,7 +1,18 @@
+import json
 import os
-from openai import OpenAI
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, OpenAI, RateLimitError
 from dotenv import load_dotenv
 
+from rate_limit import RateLimiter
+from relevance_cascade import cascade_classify, format_tier_stats
+from text_dedup import MinHashDeduper, representative
+from run_metrics import incr
+
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
@@ -21,6 +32,8 @@ def is_realestate_us(text, model="gpt-4o-mini"):
 
     Respond with only 'YES' or 'NO'.
     """
+    if client is None:
+        return False
     try:
         response = client.chat.completions.create(
             model=model,
@@ -39,84 +52,256 @@ def is_realestate_us(text, model="gpt-4o-mini"):
         return False
 
 
-def extract_issues_from_texts(items, model="gpt-4o-mini"):
+_CLASSIFY_SYSTEM = (
+    "You are a strict classifier. For each numbered text decide if it is about real estate "
+    "(housing, buying/selling, renting, mortgages, property issues, etc.) AND related to the United States. "
+    'Reply only with JSON of the form {"answers": ["YES", "NO", ...]}, one answer per text, in order.'
+)
+# Keeps one long post from blowing up a whole batch's prompt.
+_CLASSIFY_MAX_CHARS = 2000
+
+_OPENAI_LIMITER: Optional[RateLimiter] = globals().get("_OPENAI_LIMITER")
+_OPENAI_LIMITER_LOCK = globals().get("_OPENAI_LIMITER_LOCK") or threading.Lock()
+
+
+def _openai_limiter() -> RateLimiter:
+    # Built under a lock so concurrent workers share one limiter.
+    global _OPENAI_LIMITER
+    with _OPENAI_LIMITER_LOCK:
+        if _OPENAI_LIMITER is None:
+            _OPENAI_LIMITER = RateLimiter(float(os.getenv("OPENAI_REQUESTS_PER_MIN", "60")))
+        return _OPENAI_LIMITER
+
+
+def _parse_answers(content: str, expected: int) -> List[Optional[bool]]:
     """
-    Given a list of items (posts or comments with metadata),
-    extract issues/pain points mentioned in each text.
-    Skip items not related to US real estate or without clear issues.
+    Strict YES/NO array parse. Returns one entry per item, None where the
+    answer is unusable; an array of the wrong length is unusable as a whole
+    because items can no longer be matched to answers.
     """
-    results = []
+    try:
+        data = json.loads(content or "")
+    except ValueError:
+        return [None] * expected
+    answers = data.get("answers") if isinstance(data, dict) else data
+    if not isinstance(answers, list) or len(answers) != expected:
+        return [None] * expected
+    out = []
+    for a in answers:
+        a = str(a).strip().upper() if isinstance(a, (str, bool)) else ""
+        out.append(True if a in ("YES", "TRUE") else False if a in ("NO", "FALSE") else None)
+    return out
 
-    for item in items:
-        text = item.get("text", "").strip()
-        if not text:
-            continue
 
-        # Relevance check
-        if not is_realestate_us(text, model=model):
-            continue
+def _classify_batch(texts: List[str], model: str) -> List[Optional[bool]]:
+    numbered = "\n\n".join(f"{i}. {t[:_CLASSIFY_MAX_CHARS]}" for i, t in enumerate(texts, start=1))
+    incr("openai_classify_requests")
+    try:
+        response = _with_backoff(
+            client.chat.completions.create,
+            model=model,
+            messages=[
+                {"role": "system", "content": _CLASSIFY_SYSTEM},
+                {"role": "user", "content": f"Classify these {len(texts)} texts:\n\n{numbered}"},
+            ],
+            temperature=0,
+            max_tokens=16 + 4 * len(texts),
+            response_format={"type": "json_object"},
+        )
+        content = response.choices[0].message.content if response.choices else ""
+    except Exception as e:
+        print(f"Error in batch classifier: {e}")
+        return [None] * len(texts)
+    return _parse_answers(content, len(texts))
+
+
+def classify_realestate_us_batch(
+    texts: List[str],
+    model: str = "gpt-4o-mini",
+    batch_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    max_rounds: int = 3,
+) -> List[bool]:
+    """
+    Batched is_realestate_us: sends batch_size numbered texts per request,
+    running batches concurrently under the OpenAI rate limit. Items whose
+    answer could not be parsed are re-batched (alone, without the items
+    that succeeded) for up to max_rounds; anything still unresolved counts
+    as not relevant, like a classifier error does.
+    """
+    if client is None:
+        return [False] * len(texts)
+    batch_size = batch_size or int(os.getenv("OPENAI_CLASSIFY_BATCH_SIZE", "20"))
+    max_workers = max_workers or int(os.getenv("OPENAI_MAX_WORKERS", "4"))
+    results: List[Optional[bool]] = [None] * len(texts)
+    todo = [i for i, t in enumerate(texts) if (t or "").strip()]
+    for _ in range(max_rounds):
+        if not todo:
+            break
+        batches = [todo[i : i + batch_size] for i in range(0, len(todo), batch_size)]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="classify") as pool:
+            answers = list(pool.map(lambda b: _classify_batch([texts[i] for i in b], model), batches))
+        for batch, batch_answers in zip(batches, answers):
+            for i, answer in zip(batch, batch_answers):
+                results[i] = answer
+        todo = [i for i in todo if results[i] is None]
+        if todo:
+            incr("openai_classify_retried_items", len(todo))
+    return [bool(r) for r in results]
+
+
+_EXTRACT_SYSTEM = (
+    "You analyse Reddit text for a US real-estate product team. Decide whether the text is about real estate "
+    "(housing, buying/selling, renting, mortgages, property issues, etc.) AND related to the United States, "
+    "and if so list the specific issues, problems or pain points it describes. "
+    'Reply only with JSON: {"relevant": true|false, "issues": ["...", ...]}. '
+    "Use an empty issues list when the text is not relevant or describes no issues."
+)
+_NO_ISSUES = ("none", "no issues", "n/a", "-")
 
-        # Issue extraction
-        prompt = f"""
-        Extract the specific issues, problems, or pain points described in the following text:
-        "{text}"
 
-        Respond with a clear bullet list of issues only.
-        If there are no issues, just respond with "None".
-        """
+def _with_backoff(fn, *args, **kwargs):
+    """Call fn under the OpenAI rate limit, retrying rate-limit, timeout and 5xx errors."""
+    max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+    backoff = float(os.getenv("OPENAI_BACKOFF_BASE_SEC", "2"))
+    for attempt in range(max_retries):
+        _openai_limiter().acquire()
         try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an assistant that extracts pain points and issues from real estate text. "
-                                   "If no issues are present, respond with 'None'."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,
-                max_tokens=300
-            )
-
-            issues_text = response.choices[0].message.content.strip() if response.choices else ""
-
-            # Skip if no issues found and normalize to list
-            if not issues_text or issues_text.lower() in ["none", "no issues", "n/a", "-"]:
-                continue
-
-            issues_list = [i.strip("-• \n") for i in issues_text.split("\n") if i.strip()]
-
-            # Store metadata
-            result_doc = {
-                "text": text,
-                "issues_raw": issues_text,
-                "issues": issues_list,
-                "source": item.get("source"),
-                # Post metadata
-                "post_title": item.get("post_title"),
-                "post_selftext": item.get("post_selftext"),
-                "post_author": item.get("post_author"),
-                "post_url": item.get("post_url"),
-                "post_upvotes": item.get("post_upvotes"),
-                "post_created_utc": item.get("post_created_utc"),
-                "subreddit": item.get("subreddit"),
-                # Comment metadata
-                "comment_author": item.get("comment_author"),
-                "comment_url": item.get("comment_url"),
-                "comment_upvotes": item.get("comment_upvotes"),
-                "comment_created_utc": item.get("comment_created_utc")
-            }
-
-            results.append(result_doc)
-
-        except Exception as e:
-            print(f"Error processing text: {e}")
+            return fn(*args, **kwargs)
+        except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError):
+            if attempt == max_retries - 1:
+                raise
+            incr("openai_retries")
+            time.sleep(backoff * (2 ** attempt))
 
-    return results
-    if client is None:
-        return False
 
+def extraction_request(text: str, model: str = "gpt-4o-mini") -> Dict:
+    """Chat-completions body for one classify+extract call (shared with batch jobs)."""
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": _EXTRACT_SYSTEM},
+            {"role": "user", "content": f'Text:\n"{text}"'},
+        ],
+        "temperature": 0,
+        "max_tokens": 400,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def parse_extraction(content: str) -> Dict:
+    try:
+        data = json.loads(content or "{}")
+    except ValueError:
+        data = {}
+    issues = data.get("issues") if isinstance(data, dict) else None
+    issues = [str(i).strip("-• \n") for i in (issues or []) if str(i).strip()]
+    issues = [i for i in issues if i and i.lower() not in _NO_ISSUES]
+    return {"relevant": bool(isinstance(data, dict) and data.get("relevant")), "issues": issues}
+
+
+def classify_and_extract(text: str, model: str = "gpt-4o-mini") -> Dict:
+    """One call that both checks relevance and extracts issues: {"relevant": bool, "issues": [str]}."""
+    response = _with_backoff(client.chat.completions.create, **extraction_request(text, model))
+    content = response.choices[0].message.content if response.choices else ""
+    return parse_extraction(content)
+
+
+def issue_doc(item: Dict, text: str, issues: List[str]) -> Dict:
+    return {
+        "text": text,
+        "issues_raw": "\n".join(f"- {i}" for i in issues),
+        "issues": issues,
+        "source": item.get("source"),
+        # Post metadata
+        "post_title": item.get("post_title"),
+        "post_selftext": item.get("post_selftext"),
+        "post_author": item.get("post_author"),
+        "post_url": item.get("post_url"),
+        "post_upvotes": item.get("post_upvotes"),
+        "post_created_utc": item.get("post_created_utc"),
+        "subreddit": item.get("subreddit"),
+        # Comment metadata
+        "comment_author": item.get("comment_author"),
+        "comment_url": item.get("comment_url"),
+        "comment_upvotes": item.get("comment_upvotes"),
+        "comment_created_utc": item.get("comment_created_utc"),
+    }
+
+
+def extraction_plan(texts: List[str], dedup: Optional[bool] = None) -> List[Tuple[int, List[int]]]:
+    """
+    (representative, members) pairs: the texts that actually need an
+    extraction call, and the texts each one's result applies to.
+
+    Near-duplicate texts (reposts, quoted replies, boilerplate) are grouped
+    first (DEDUP_ENABLED, threshold DEDUP_THRESHOLD) and the fullest member
+    stands for the group. Groups whose representative the local relevance
+    cascade rejects (CASCADE_PREFILTER) are dropped.
+    """
+    if dedup is None:
+        dedup = os.getenv("DEDUP_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+    if dedup and texts:
+        groups = MinHashDeduper().groups(texts)
+        print(f"De-duplicated {len(texts)} texts into {len(groups)} groups.")
+        incr("dedup_texts_skipped", len(texts) - len(groups))
+    else:
+        groups = [[i] for i in range(len(texts))]
+    plan = [(representative(group, texts), group) for group in groups]
+
+    if plan and os.getenv("CASCADE_PREFILTER", "1").strip().lower() not in ("0", "false", "no"):
+        # Drop texts the local tiers reject with confidence before any LLM call.
+        decisions, tier_stats = cascade_classify([texts[rep] for rep, _ in plan])
+        print(format_tier_stats(tier_stats))
+        plan = [entry for entry, decision in zip(plan, decisions) if decision is not False]
+    return plan
+
+
+def extract_issues_from_texts(
+    items,
+    model="gpt-4o-mini",
+    max_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    dedup: Optional[bool] = None,
+):
+    """
+    Given a list of items (posts or comments with metadata),
+    extract issues/pain points mentioned in each text.
+    Skip items not related to US real estate or without clear issues.
+
+    Only representatives from extraction_plan are sent, one classify+extract
+    call each on a bounded pool (OPENAI_MAX_WORKERS), with
+    on_progress(done, total) as calls finish. A representative's issues are
+    copied to every member of its group with the member's own text and
+    metadata. Results keep the input order.
+    """
     if client is None:
         print("OPENAI_API_KEY not set; skipping issue extraction.")
         return []
+
+    items = [item for item in items if item.get("text", "").strip()]
+    texts = [item["text"].strip() for item in items]
+    plan = extraction_plan(texts, dedup)
+    max_workers = max_workers or int(os.getenv("OPENAI_MAX_WORKERS", "4"))
+
+    outcomes: List[Optional[Dict]] = [None] * len(texts)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extract") as pool:
+        futures = {pool.submit(classify_and_extract, texts[rep], model): members for rep, members in plan}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                outcome = future.result()
+            except Exception as e:
+                print(f"Error processing text: {e}")
+            else:
+                for i in futures[future]:
+                    outcomes[i] = outcome
+            if on_progress:
+                on_progress(done, len(plan))
+
+    results = []
+    for item, text, outcome in zip(items, texts, outcomes):
+        # Skip irrelevant items and items without issues
+        if not outcome or not outcome["relevant"] or not outcome["issues"]:
+            continue
+        results.append(issue_doc(item, text, list(outcome["issues"])))
+    return results
@@ -0,0 +1,185 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from run_metrics import incr
+
+
+# Tier 1: keywords. Strong terms are specific to property/housing; US signals
+# tie a text to the United States; foreign signals point elsewhere.
+_STRONG_TERMS = re.compile(
+    r"\b(real ?estate|realtors?|mortgages?|landlords?|tenants?|leases?|leasing|escrow|closing costs?|"
+    r"down ?payments?|hoas?|property tax(es)?|propert(y|ies)|home ?owners?'?s?|homebuy(er|ers|ing)|homes?|"
+    r"houses?|housing|apartments?|condos?|townhomes?|townhouses?|duplex(es)?|house hunting|"
+    r"listing agents?|buyer'?s agents?|appraisals?|refinanc(e|ed|ing)|pre-?approv(al|ed)|evictions?|evicted|"
+    r"security deposits?|zillow|redfin|mls|fha|va loans?|conventional loans?|pmi|earnest money|"
+    r"inspections?|home inspectors?|title insurance|rent|rents|rent(al|als|ed|ing|ers?))\b",
+    re.IGNORECASE,
+)
+_US_SIGNALS = re.compile(
+    r"\b(usa|u\.s\.a?\.?|united states|america|american|fha|va loan|irs|401k|zillow|redfin|hud|fannie|freddie|"
+    r"alabama|alaska|arizona|arkansas|california|colorado|connecticut|delaware|florida|georgia|hawaii|idaho|"
+    r"illinois|indiana|iowa|kansas|kentucky|louisiana|maine|maryland|massachusetts|michigan|minnesota|"
+    r"mississippi|missouri|montana|nebraska|nevada|new hampshire|new jersey|new mexico|new york|"
+    r"north carolina|north dakota|ohio|oklahoma|oregon|pennsylvania|rhode island|south carolina|"
+    r"south dakota|tennessee|texas|utah|vermont|virginia|washington|west virginia|wisconsin|wyoming|"
+    r"nyc|los angeles|san francisco|chicago|houston|phoenix|dallas|austin|seattle|denver|boston|atlanta|miami)\b",
+    re.IGNORECASE,
+)
+_FOREIGN_SIGNALS = re.compile(
+    r"(£|€|\b(uk|united kingdom|england|scotland|london|canada|canadian|ontario|toronto|vancouver|australia|"
+    r"australian|sydney|melbourne|india|germany|ireland|dublin|new zealand|stamp duty|council tax|"
+    r"rightmove|cmhc|strata)\b)",
+    re.IGNORECASE,
+)
+
+# Whole texts that are only chatter or removal markers.
+_CHATTER = re.compile(
+    r"^\W*((lol|lmao|haha+|thanks?|thank you|ty|this|same|agreed|nice|wow|yes|no|ok(ay)?|"
+    r"\[?deleted\]?|\[?removed\]?)\W*)+$",
+    re.IGNORECASE,
+)
+
+# Tier 2: prototype texts for embedding similarity.
+POSITIVE_PROTOTYPES = [
+    "We are first-time home buyers in Texas trying to get a mortgage pre-approval.",
+    "My landlord in California won't return my security deposit after I moved out.",
+    "Our realtor says we should waive the inspection to win a bidding war in the US housing market.",
+    "Property taxes and HOA fees keep going up on our house in Florida.",
+    "Should I refinance my 30-year fixed mortgage now that rates dropped?",
+    "Selling our home and the buyer's agent commission seems too high.",
+    "Looking for an apartment to rent in New York City, rents are insane.",
+]
+NEGATIVE_PROTOTYPES = [
+    "lol",
+    "This is hilarious, thanks for sharing.",
+    "What game are you playing tonight?",
+    "Buying a flat in London, the stamp duty is brutal.",
+    "Renting in Toronto is impossible right now, CMHC rules changed.",
+    "My favourite recipe for banana bread.",
+    "Deleted",
+]
+
+TIERS = ("keyword", "embedding", "llm", "fallback")
+
+
+def _word_count(text: str) -> int:
+    return len(re.findall(r"\w+", text or ""))
+
+
+def keyword_decision(text: str, negatives: bool = True) -> Optional[bool]:
+    """
+    True/False when keywords settle it with confidence, else None. Only
+    plain chatter is rejected here: texts matching _CHATTER, or of at most
+    CASCADE_KEYWORD_NO_MAX_WORDS words without any housing vocabulary.
+    Everything else undecided goes on to the embedding and LLM tiers.
+    """
+    strong = {m.group(0).lower() for m in _STRONG_TERMS.finditer(text or "")}
+    if negatives and not strong and (
+        _CHATTER.match(text or "") or _word_count(text) <= int(os.getenv("CASCADE_KEYWORD_NO_MAX_WORDS", "4"))
+    ):
+        return False
+    foreign = bool(_FOREIGN_SIGNALS.search(text or ""))
+    if len(strong) >= 2 and _US_SIGNALS.search(text or "") and not foreign:
+        return True
+    return None
+
+
+_EMBEDDER = globals().get("_EMBEDDER")
+_PROTOTYPE_VECTORS = globals().get("_PROTOTYPE_VECTORS")
+
+
+def _embedder():
+    """sentence-transformers model and normalized prototype vectors; None if unavailable."""
+    global _EMBEDDER, _PROTOTYPE_VECTORS
+    if _EMBEDDER is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(os.getenv("CASCADE_EMBED_MODEL", "all-MiniLM-L6-v2"))
+            _PROTOTYPE_VECTORS = (
+                model.encode(POSITIVE_PROTOTYPES, normalize_embeddings=True),
+                model.encode(NEGATIVE_PROTOTYPES, normalize_embeddings=True),
+            )
+            _EMBEDDER = model
+        except Exception as e:
+            # Not installed, or the model can't be downloaded (e.g. offline): skip this tier.
+            print(f"Embedding tier unavailable: {e}")
+            _EMBEDDER = False
+            return None
+    return _EMBEDDER or None
+
+
+def embedding_decisions(texts: List[str]) -> List[Optional[bool]]:
+    """
+    Compare each text with the prototypes: the margin between its best
+    positive and best negative cosine similarity settles it past the
+    CASCADE_EMBED_YES / CASCADE_EMBED_NO thresholds, otherwise None.
+    """
+    model = _embedder()
+    if model is None or not texts:
+        return [None] * len(texts)
+    yes_margin = float(os.getenv("CASCADE_EMBED_YES", "0.25"))
+    no_margin = float(os.getenv("CASCADE_EMBED_NO", "-0.15"))
+    positives, negatives = _PROTOTYPE_VECTORS
+    vectors = model.encode(texts, normalize_embeddings=True, batch_size=64)
+    margins = (vectors @ positives.T).max(axis=1) - (vectors @ negatives.T).max(axis=1)
+    out = []
+    for margin in margins:
+        out.append(True if margin >= yes_margin else False if margin <= no_margin else None)
+    return out
+
+
+def cascade_classify(
+    texts: List[str],
+    llm: Optional[Callable[[List[str]], List[bool]]] = None,
+    fallback: Optional[Callable[[str], bool]] = None,
+    use_embeddings: bool = True,
+    keyword_negatives: bool = True,
+) -> Tuple[List[Optional[bool]], Dict[str, int]]:
+    """
+    US real-estate relevance in tiers: keywords, then embeddings, then the
+    llm callable (batch in, batch out) for whatever is still ambiguous. With
+    no llm, fallback(text) decides; with neither, ambiguous items stay None.
+    Returns (decisions, per-tier counts), and counts go to run metrics.
+    keyword_negatives=False stops short texts without housing words from
+    being rejected outright (e.g. compound subreddit names).
+    """
+    decisions: List[Optional[bool]] = [None] * len(texts)
+    stats = {tier: 0 for tier in TIERS}
+    stats["total"] = len(texts)
+
+    for i, text in enumerate(texts):
+        decisions[i] = keyword_decision(text, negatives=keyword_negatives)
+        if decisions[i] is not None:
+            stats["keyword"] += 1
+
+    pending = [i for i, d in enumerate(decisions) if d is None]
+    if use_embeddings and pending:
+        for i, d in zip(pending, embedding_decisions([texts[i] for i in pending])):
+            if d is not None:
+                decisions[i] = d
+                stats["embedding"] += 1
+
+    pending = [i for i, d in enumerate(decisions) if d is None]
+    if pending and llm is not None:
+        for i, d in zip(pending, llm([texts[i] for i in pending])):
+            decisions[i] = bool(d)
+        stats["llm"] = len(pending)
+    elif pending and fallback is not None:
+        for i in pending:
+            decisions[i] = bool(fallback(texts[i]))
+        stats["fallback"] = len(pending)
+
+    for tier in TIERS:
+        if stats[tier]:
+            incr(f"cascade_{tier}", stats[tier])
+    return decisions, stats
+
+
+def format_tier_stats(stats: Dict[str, int]) -> str:
+    total = stats.get("total") or 0
+    if not total:
+        return "Relevance cascade: no texts."
+    parts = [f"{tier} {stats.get(tier, 0)} ({stats.get(tier, 0) * 100 / total:.0f}%)" for tier in TIERS]
+    return f"Relevance cascade over {total} texts: " + ", ".join(parts)
@@ -0,0 +1,28 @@
+import threading
+from typing import Any, Dict
+
+
+_RUN_METRICS: Dict[str, Any] = {}
+_LOCK = threading.Lock()
+
+
+def incr(name: str, amount=1) -> None:
+    with _LOCK:
+        _RUN_METRICS[name] = _RUN_METRICS.get(name, 0) + amount
+
+
+def record(name: str, value: Any) -> None:
+    with _LOCK:
+        entries = _RUN_METRICS.setdefault(name, [])
+        entries.append(value)
+        # Keep bounded memory for long-running Streamlit sessions.
+        if len(entries) > 500:
+            del entries[:250]
+
+
+def get_run_metrics(clear: bool = False) -> Dict[str, Any]:
+    with _LOCK:
+        data = {k: (list(v) if isinstance(v, list) else v) for k, v in _RUN_METRICS.items()}
+        if clear:
+            _RUN_METRICS.clear()
+    return data
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from gspread.exceptions import APIError
+from gspread.utils import rowcol_to_a1
+
+from run_metrics import incr
+
+
+class SheetMirror:
+    """
+    On-disk copy of a worksheet's values. sync() fetches only rows appended
+    since the previous sync with one batch_get (header, and an open-ended
+    range starting at the last known row) and falls back to a full download
+    when the header changed or the last known row no longer matches, i.e.
+    rows were removed or rewritten.
+
+    Mirrored rows are treated as append-only: writes made by this process
+    are applied with patch_rows(), but another writer's edit to a middle row
+    is only picked up by the periodic full download
+    (GOOGLE_SHEET_MIRROR_FULL_SYNC_SEC, default one hour).
+    """
+
+    def __init__(self, base_path: str):
+        self.rows_path = f"{base_path}.rows.jsonl"
+        self.meta_path = f"{base_path}.meta.json"
+        self._lock = threading.Lock()
+        self.header: List[str] = []
+        self.rows: List[List[str]] = []
+        self.full_synced_at = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self.rows_path, "r", encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        except (OSError, json.JSONDecodeError):
+            return
+        row_count = int(meta.get("row_count", 0))
+        if len(rows) < row_count:
+            # Interrupted write; the next sync does a full download.
+            return
+        self.header = meta.get("header") or []
+        self.rows = rows[:row_count]
+        self.full_synced_at = float(meta.get("full_synced_at", 0.0))
+
+    def _write_meta(self) -> None:
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"header": self.header, "row_count": len(self.rows), "full_synced_at": self.full_synced_at}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _write_all(self) -> None:
+        os.makedirs(os.path.dirname(self.rows_path) or ".", exist_ok=True)
+        tmp_path = f"{self.rows_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in self.rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.rows_path)
+        self._write_meta()
+
+    def _append(self, new_rows: List[List[str]]) -> None:
+        with open(self.rows_path, "a", encoding="utf-8") as f:
+            for row in new_rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.rows.extend(new_rows)
+        self._write_meta()
+
+    def _full_resync(self, ws) -> None:
+        values = ws.get_all_values()
+        incr("sheets_api_calls")
+        self.header = values[0] if values else []
+        self.rows = values[1:] if values else []
+        self.full_synced_at = time.time()
+        self._write_all()
+        incr("sheet_mirror_full_syncs")
+
+    @staticmethod
+    def _trimmed(row: List[str]) -> List[str]:
+        row = list(row or [])
+        while row and not row[-1]:
+            row.pop()
+        return row
+
+    def sync(self, ws) -> List[List[str]]:
+        """Bring the mirror up to date and return header + data rows."""
+        with self._lock:
+            max_age = float(os.getenv("GOOGLE_SHEET_MIRROR_FULL_SYNC_SEC", "3600"))
+            if not self.header or (max_age > 0 and time.time() - self.full_synced_at > max_age):
+                self._full_resync(ws)
+                return [self.header] + self.rows if self.header else []
+
+            # Both ranges stay inside the grid: the last known row exists
+            # unless rows were deleted, and the width covers every column the
+            # worksheet had when opened plus any header added since.
+            known = len(self.rows)
+            last_col = rowcol_to_a1(1, max(ws.col_count, len(self.header), 1)).rstrip("1")
+            try:
+                header_vr, tail_vr = ws.batch_get([f"A1:{last_col}1", f"A{known + 1}:{last_col}"])
+            except APIError:
+                # Typically "exceeds grid limits" after rows were deleted.
+                self._full_resync(ws)
+                return [self.header] + self.rows
+            incr("sheets_api_calls")
+
+            header = list(header_vr[0]) if header_vr else []
+            tail = [list(r) for r in tail_vr]
+            last_row = tail[0] if tail else []
+            mirrored_last = self.rows[-1] if self.rows else self.header
+            if self._trimmed(header) != self._trimmed(self.header) or (
+                self._trimmed(last_row) != self._trimmed(mirrored_last)
+            ):
+                self._full_resync(ws)
+            elif len(tail) > 1:
+                self._append(tail[1:])
+                incr("sheet_mirror_rows_fetched", len(tail) - 1)
+            return [self.header] + self.rows
+
+    def patch_rows(self, updates: Dict[int, List]) -> None:
+        """Apply in-place writes (sheet row number -> values) made by this process."""
+        with self._lock:
+            changed = False
+            for row_num, values in updates.items():
+                idx = row_num - 2
+                if 0 <= idx < len(self.rows):
+                    current = list(self.rows[idx]) + [""] * max(0, len(values) - len(self.rows[idx]))
+                    for i, v in enumerate(values):
+                        # None cells are skipped by the Sheets API, so they keep their value.
+                        if v is not None:
+                            current[i] = str(v)
+                    self.rows[idx] = current
+                    changed = True
+            if changed:
+                self._write_all()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.header = []
+            self.rows = []
+
+
+_MIRRORS: Dict[str, SheetMirror] = globals().get("_MIRRORS", {})
+_MIRRORS_LOCK = globals().get("_MIRRORS_LOCK") or threading.Lock()
+
+
+def mirror_enabled() -> bool:
+    return os.getenv("GOOGLE_SHEET_MIRROR", "1").strip().lower() not in ("0", "false", "no")
+
+
+def get_mirror(sheet_id: str, worksheet_name: str) -> SheetMirror:
+    mirror_dir = os.getenv("GOOGLE_SHEET_MIRROR_DIR", ".cache")
+    digest = hashlib.sha256(f"{sheet_id}:{worksheet_name}".encode("utf-8")).hexdigest()[:16]
+    base_path = os.path.join(mirror_dir, f"sheet_mirror_{digest}")
+    with _MIRRORS_LOCK:
+        mirror: Optional[SheetMirror] = _MIRRORS.get(base_path)
+        if mirror is None:
+            mirror = SheetMirror(base_path)
+            _MIRRORS[base_path] = mirror
+        return mirror
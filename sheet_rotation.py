@@ -0,0 +1,153 @@
+import os
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import gspread
+
+from run_metrics import incr
+
+
+INDEX_HEADERS = ["partition", "period", "first_row", "last_row", "row_count", "updated_at_utc"]
+LEGACY_PERIOD = "legacy"
+
+
+def rotation_mode() -> str:
+    mode = os.getenv("GOOGLE_SHEET_ROTATION", "none").strip().lower()
+    return mode if mode in ("none", "monthly") else "none"
+
+
+def current_period(now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    return now.strftime("%Y-%m")
+
+
+def partition_title(base: str, period: str) -> str:
+    return f"{base}_{period.replace('-', '_')}"
+
+
+def index_title(base: str) -> str:
+    return f"{base}_index"
+
+
+def quote_title(title: str) -> str:
+    return "'" + title.replace("'", "''") + "'"
+
+
+class PartitionIndex:
+    """
+    Small worksheet listing time partitions of the data worksheet and the row
+    range each one holds. Readers use it to pick partitions without listing
+    every worksheet, and skip locating the end of closed partitions.
+
+    Row counts are written once a partition is closed (no longer the one
+    receiving appends), from the sheet itself rather than by incrementing,
+    so concurrent writers converge on the same value. The open partition's
+    count stays empty.
+    """
+
+    def __init__(self, spreadsheet, base: str):
+        self.spreadsheet = spreadsheet
+        self.base = base
+        self.ws = None
+        self.entries: List[Dict] = []
+
+    def load(self) -> None:
+        try:
+            self.ws = self.spreadsheet.worksheet(index_title(self.base))
+            incr("sheets_api_calls")
+            self._read()
+        except gspread.WorksheetNotFound:
+            self._create()
+
+    def _read(self) -> None:
+        values = self.ws.get_all_values()
+        incr("sheets_api_calls")
+        # Two writers can add the same partition at once; keep one entry per
+        # title, filling its empty fields from the duplicates.
+        entries: Dict[str, Dict] = {}
+        for row in values[1:]:
+            if not row or not row[0]:
+                continue
+            entry = dict(zip(INDEX_HEADERS, row))
+            kept = entries.setdefault(entry["partition"], entry)
+            for key, value in entry.items():
+                if value and not kept.get(key):
+                    kept[key] = value
+        self.entries = list(entries.values())
+
+    def _create(self) -> None:
+        # Recover partitions that already exist (e.g. the index was deleted),
+        # and keep the pre-rotation worksheet readable as the oldest partition.
+        pattern = re.compile(rf"^{re.escape(self.base)}_(\d{{4}})_(\d{{2}})$")
+        existing = self.spreadsheet.worksheets()
+        incr("sheets_api_calls")
+        rows = []
+        for ws in existing:
+            match = pattern.match(ws.title)
+            if ws.title == self.base:
+                rows.append([ws.title, LEGACY_PERIOD, 2, "", "", ""])
+            elif match:
+                rows.append([ws.title, f"{match.group(1)}-{match.group(2)}", 2, "", "", ""])
+        self.ws = self.spreadsheet.add_worksheet(title=index_title(self.base), rows=100, cols=len(INDEX_HEADERS))
+        self.ws.update("A1", [INDEX_HEADERS] + rows)
+        incr("sheets_api_calls", 2)
+        self.entries = [dict(zip(INDEX_HEADERS, [str(v) for v in row])) for row in rows]
+
+    def partitions(self) -> List[str]:
+        """Partition titles, oldest first."""
+        ordered = sorted(self.entries, key=lambda e: ("" if e.get("period") == LEGACY_PERIOD else e.get("period", "")))
+        return list(dict.fromkeys(e["partition"] for e in ordered))
+
+    def ensure(self, title: str, period: str) -> bool:
+        """Add title to the index if missing; True when it was added."""
+        if any(e.get("partition") == title for e in self.entries):
+            return False
+        # Another process may have added it since this index was loaded.
+        self._read()
+        if any(e.get("partition") == title for e in self.entries):
+            return False
+        row = [title, period, 2, "", "", ""]
+        self.ws.append_rows([row], value_input_option="RAW")
+        incr("sheets_api_calls")
+        self.entries.append(dict(zip(INDEX_HEADERS, [str(v) for v in row])))
+        return True
+
+    def uncounted(self, exclude: str) -> List[str]:
+        """Closed partitions (all but exclude) whose row count is not recorded yet."""
+        return [
+            e["partition"] for e in self.entries if e.get("partition") != exclude and not str(e.get("row_count") or "").strip()
+        ]
+
+    def last_rows(self) -> Dict[str, int]:
+        """Last sheet row of each partition with a recorded count."""
+        out = {}
+        for e in self.entries:
+            try:
+                out[e["partition"]] = int(e.get("last_row") or "")
+            except ValueError:
+                continue
+        return out
+
+    def set_counts(self, counts: Dict[str, int], now_iso: str) -> None:
+        """
+        Record row counts for closed partitions. Index rows are located by
+        partition title from a fresh read, since other writers may have
+        appended partitions since this index was loaded.
+        """
+        if not counts:
+            return
+        titles = self.ws.col_values(1)
+        incr("sheets_api_calls")
+        data = []
+        for title, count in counts.items():
+            if title not in titles:
+                continue
+            sheet_row = titles.index(title) + 1
+            data.append({"range": f"D{sheet_row}:F{sheet_row}", "values": [[count + 1, count, now_iso]]})
+            for e in self.entries:
+                if e.get("partition") == title:
+                    e.update({"last_row": str(count + 1), "row_count": str(count), "updated_at_utc": now_iso})
+        if data:
+            self.ws.batch_update(data, value_input_option="RAW")
+            incr("sheets_api_calls")
@@ -0,0 +1,218 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+def spool_enabled() -> bool:
+    return os.getenv("SHEETS_SPOOL", "1").strip().lower() not in ("0", "false", "no")
+
+
+class WriteSpool:
+    """
+    Append-only local spool of rows waiting for a remote write. Rows are
+    committed to SQLite before the remote write is attempted and deleted only
+    after it succeeded, so a crash or restart never loses them. Remote writes
+    upsert by post_id, so replaying a batch that partly landed is harmless.
+
+    Rows the remote keeps rejecting move to a dead_letter table, so one bad
+    row can't hold back everything queued behind it: after max_attempts
+    failed flushes, or at once for errors permanent() recognizes (those
+    batches are bisected first so only the offending rows are set aside).
+    """
+
+    def __init__(self, path: str, max_attempts: Optional[int] = None):
+        self.path = path
+        self.max_attempts = max_attempts or int(os.getenv("SHEETS_SPOOL_MAX_ATTEMPTS", "20"))
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, enqueued_at REAL NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letter ("
+                "id INTEGER PRIMARY KEY, payload TEXT NOT NULL, enqueued_at REAL NOT NULL, "
+                "attempts INTEGER NOT NULL, last_error TEXT, failed_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: a row acknowledged by append() survives power loss, not just a crash.
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, rows: List[Dict]) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO spool (payload, enqueued_at) VALUES (?, ?)",
+                [(json.dumps(r, ensure_ascii=False, default=str), now) for r in rows],
+            )
+
+    def depth(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def drain(
+        self,
+        sink: Callable[[List[Dict]], None],
+        batch_size: int = 200,
+        permanent: Optional[Callable[[Exception], bool]] = None,
+    ) -> int:
+        """
+        Hand spooled rows to sink oldest first, batch_size at a time, deleting
+        each batch once sink returns. A failing batch stays spooled (with its
+        attempt count and error recorded) and the exception propagates,
+        unless the failure dead-letters it (see the class docstring).
+        """
+        conn = self._connect()
+        drained = 0
+        while True:
+            batch = conn.execute(
+                "SELECT id, payload, attempts FROM spool ORDER BY id LIMIT ?", (max(1, batch_size),)
+            ).fetchall()
+            if not batch:
+                return drained
+            try:
+                drained += self._deliver(sink, [(row_id, payload) for row_id, payload, _ in batch], permanent)
+            except Exception as e:
+                ids = [row_id for row_id, _, _ in batch]
+                placeholders = ", ".join("?" for _ in ids)
+                with conn:
+                    conn.execute(
+                        f"UPDATE spool SET attempts = attempts + 1, last_error = ? WHERE id IN ({placeholders})",
+                        [str(e)[:500]] + ids,
+                    )
+                if max(attempts for _, _, attempts in batch) + 1 < self.max_attempts:
+                    raise
+                self._dead_letter(ids)
+                print(f"Spool: moved {len(ids)} rows to dead letters after {self.max_attempts} failed attempts: {e}")
+
+    def _deliver(self, sink, batch: List, permanent: Optional[Callable[[Exception], bool]]) -> int:
+        """Write batch; on a permanent error, bisect and dead-letter only the rows that fail alone."""
+        ids = [row_id for row_id, _ in batch]
+        try:
+            sink([json.loads(payload) for _, payload in batch])
+        except Exception as e:
+            if permanent is None or not permanent(e):
+                raise
+            if len(batch) == 1:
+                with self._connect() as conn:
+                    conn.execute("UPDATE spool SET last_error = ? WHERE id = ?", (str(e)[:500], ids[0]))
+                self._dead_letter(ids)
+                print(f"Spool: moved row {ids[0]} to dead letters: {e}")
+                return 0
+            mid = len(batch) // 2
+            return self._deliver(sink, batch[:mid], permanent) + self._deliver(sink, batch[mid:], permanent)
+        placeholders = ", ".join("?" for _ in ids)
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM spool WHERE id IN ({placeholders})", ids)
+        return len(ids)
+
+    def _dead_letter(self, ids: List[int]) -> None:
+        placeholders = ", ".join("?" for _ in ids)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO dead_letter (id, payload, enqueued_at, attempts, last_error, failed_at) "
+                f"SELECT id, payload, enqueued_at, attempts, last_error, ? FROM spool WHERE id IN ({placeholders})",
+                [time.time()] + ids,
+            )
+            conn.execute(f"DELETE FROM spool WHERE id IN ({placeholders})", ids)
+
+    def dead_letters(self, limit: int = 20) -> List[Dict]:
+        """Most recently dead-lettered rows, newest first."""
+        rows = self._connect().execute(
+            "SELECT id, payload, attempts, last_error, failed_at FROM dead_letter ORDER BY failed_at DESC, id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        out = []
+        for row_id, payload, attempts, last_error, failed_at in rows:
+            row = json.loads(payload)
+            out.append(
+                {
+                    "id": row_id,
+                    "post_id": row.get("post_id", ""),
+                    "subreddit": row.get("subreddit", ""),
+                    "attempts": attempts,
+                    "error": last_error or "",
+                    "failed_at": failed_at,
+                }
+            )
+        return out
+
+    def requeue_dead_letters(self) -> int:
+        """Move every dead-lettered row back to the end of the spool, e.g. after fixing the cause."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, payload, enqueued_at FROM dead_letter ORDER BY id").fetchall()
+            conn.executemany("INSERT INTO spool (payload, enqueued_at) VALUES (?, ?)", [(p, t) for _, p, t in rows])
+            conn.execute("DELETE FROM dead_letter")
+        return len(rows)
+
+    def stats(self) -> Dict:
+        depth, oldest, attempts = self._connect().execute(
+            "SELECT COUNT(*), MIN(enqueued_at), COALESCE(MAX(attempts), 0) FROM spool"
+        ).fetchone()
+        last_error = self._connect().execute(
+            "SELECT last_error FROM spool WHERE last_error IS NOT NULL ORDER BY id LIMIT 1"
+        ).fetchone()
+        dead = self._connect().execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {
+            "path": self.path,
+            "depth": depth,
+            "oldest_age_sec": round(time.time() - oldest, 1) if oldest else 0.0,
+            "max_attempts": attempts,
+            "last_error": last_error[0] if last_error else "",
+            "dead_letters": dead,
+        }
+
+
+class SpoolFlusher(threading.Thread):
+    """
+    Daemon thread that periodically calls flush() until it succeeds, backing
+    off exponentially (up to max_backoff_sec) while the remote keeps failing.
+    """
+
+    def __init__(self, flush: Callable[[], None], interval_sec: float, max_backoff_sec: float = 300.0):
+        super().__init__(name="sheets-spool-flusher", daemon=True)
+        self.flush = flush
+        self.interval_sec = max(1.0, interval_sec)
+        self.max_backoff_sec = max(self.interval_sec, max_backoff_sec)
+        self._wake = threading.Event()
+        self.failures = 0
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def run(self) -> None:
+        while True:
+            delay = min(self.interval_sec * (2 ** self.failures), self.max_backoff_sec)
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                self.flush()
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                print(f"Spool flush failed (attempt {self.failures}): {e}")
+
+
+_SPOOLS: Dict[str, WriteSpool] = globals().get("_SPOOLS", {})
+_SPOOLS_LOCK = globals().get("_SPOOLS_LOCK") or threading.Lock()
+
+
+def get_spool(path: Optional[str] = None) -> WriteSpool:
+    path = path or os.getenv("SHEETS_SPOOL_PATH", os.path.join(".cache", "sheets_spool.db"))
+    with _SPOOLS_LOCK:
+        spool = _SPOOLS.get(path)
+        if spool is None:
+            spool = WriteSpool(path)
+            _SPOOLS[path] = spool
+        return spool
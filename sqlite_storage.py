@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from storage_schema import HEADERS, post_comment_block_row, subreddit_block_row
+
+
+DB_PATH = os.getenv("SQLITE_DB_PATH", "scraped_data.db")
+# Kept name for parity with excel_storage.EXCEL_PATH used in the app UI.
+EXCEL_PATH = DB_PATH
+TABLE = "scraped_rows"
+
+_LOCAL = threading.local()
+_INIT_LOCK = threading.Lock()
+_INITIALIZED = set()
+
+
+def _q(name: str) -> str:
+    # Some sheet headers contain spaces ("posted on"), so always quote.
+    return '"' + name.replace('"', '""') + '"'
+
+
+_COLUMNS_SQL = ", ".join(_q(h) for h in HEADERS)
+_PLACEHOLDERS = ", ".join("?" for _ in HEADERS)
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is not None and getattr(_LOCAL, "path", None) == DB_PATH:
+        return conn
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _ensure_schema(conn)
+    _LOCAL.conn = conn
+    _LOCAL.path = DB_PATH
+    return conn
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    with _INIT_LOCK:
+        if DB_PATH in _INITIALIZED:
+            return
+        columns = ", ".join(f"{_q(h)} TEXT" for h in HEADERS)
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} (row_id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_post_id ON {TABLE} (post_id)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_subreddit ON {TABLE} (subreddit)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_scraped_at ON {TABLE} (scraped_at_utc)")
+        _INITIALIZED.add(DB_PATH)
+
+
+def _cell(value):
+    # Match Google Sheets semantics: everything is read back as text.
+    return None if value is None else str(value)
+
+
+_UPDATE_SQL = ", ".join(f"{_q(h)} = COALESCE(?, {_q(h)})" for h in HEADERS)
+
+
+def _insert(rows: List[Dict]) -> None:
+    """Upsert by post_id (same semantics as the Sheets store); other rows are appended."""
+    if not rows:
+        return
+    conn = _connect()
+    with conn:
+        inserts = []
+        pending = {}
+        for r in rows:
+            values = [_cell(r.get(h)) for h in HEADERS]
+            post_id = _cell(r.get("post_id"))
+            if post_id and post_id in pending:
+                # Same post twice in one batch: later non-empty fields win.
+                earlier = inserts[pending[post_id]]
+                inserts[pending[post_id]] = [v if v is not None else e for e, v in zip(earlier, values)]
+                continue
+            if post_id:
+                cur = conn.execute(f"UPDATE {TABLE} SET {_UPDATE_SQL} WHERE post_id = ?", values + [post_id])
+                if cur.rowcount:
+                    continue
+                pending[post_id] = len(inserts)
+            inserts.append(values)
+        conn.executemany(f"INSERT INTO {TABLE} ({_COLUMNS_SQL}) VALUES ({_PLACEHOLDERS})", inserts)
+
+
+def _to_dict(record) -> Dict:
+    return {h: ("" if v is None else v) for h, v in zip(HEADERS, record)}
+
+
+def append_rows(rows: Iterable[Dict]) -> None:
+    _insert(list(rows or []))
+
+
+def append_subreddit_block(
+    subreddit: str,
+    query: Optional[str] = None,
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+) -> None:
+    _insert([subreddit_block_row(subreddit, query=query, title=title, description=description)])
+
+
+def append_post_comment_block(post: Dict, comments: Iterable[Dict], show_subreddit: bool) -> None:
+    _insert([post_comment_block_row(post, comments, show_subreddit)])
+
+
+def append_subreddits(records: Iterable[Dict]) -> None:
+    _insert(
+        [
+            subreddit_block_row(
+                rec.get("name"),
+                query=rec.get("query"),
+                title=rec.get("title"),
+                description=rec.get("description"),
+            )
+            for rec in records
+        ]
+    )
+
+
+def get_all_rows() -> List[Dict]:
+    cur = _connect().execute(f"SELECT {_COLUMNS_SQL} FROM {TABLE} ORDER BY row_id")
+    return [_to_dict(r) for r in cur]
+
+
+def get_recent_rows(limit: int = 50) -> List[Dict]:
+    if limit <= 0:
+        return get_all_rows()
+    cur = _connect().execute(
+        f"SELECT {_COLUMNS_SQL} FROM (SELECT * FROM {TABLE} ORDER BY row_id DESC LIMIT ?) ORDER BY row_id",
+        (limit,),
+    )
+    return [_to_dict(r) for r in cur]
+
+
+def get_subreddits(query: Optional[str] = None) -> List[str]:
+    cur = _connect().execute(
+        f"SELECT subreddit FROM {TABLE} WHERE subreddit IS NOT NULL AND subreddit != '' "
+        "GROUP BY subreddit ORDER BY MIN(row_id)"
+    )
+    return [r[0] for r in cur]
+
+
+def counts() -> Dict[str, int]:
+    conn = _connect()
+    rows, subreddits, posts = conn.execute(
+        f"SELECT COUNT(*), COUNT(DISTINCT NULLIF(subreddit, '')), COUNT(DISTINCT NULLIF(post_id, '')) FROM {TABLE}"
+    ).fetchone()
+    comments = conn.execute(
+        f"SELECT COALESCE(SUM(CAST(Comments AS INTEGER)), 0) FROM {TABLE} WHERE post_id IS NOT NULL"
+    ).fetchone()[0]
+    return {"rows": rows, "subreddits": subreddits, "posts": posts, "comments": comments}
@@ -0,0 +1,127 @@
+import importlib
+import os
+from typing import Dict, Iterable, List, Optional
+
+
+_BACKENDS = {
+    "sheets": "excel_storage",
+    "sqlite": "sqlite_storage",
+}
+_LABELS = {
+    "sheets": "Google Sheets",
+    "sqlite": "SQLite",
+}
+
+
+def backend_name() -> str:
+    name = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+    return name if name in _BACKENDS else "sheets"
+
+
+def backend_label() -> str:
+    return _LABELS[backend_name()]
+
+
+def _sheets_configured() -> bool:
+    return bool(os.getenv("GOOGLE_SHEET_ID", "").strip() and os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON", "").strip())
+
+
+def is_configured() -> bool:
+    return backend_name() != "sheets" or _sheets_configured()
+
+
+def _backend():
+    return importlib.import_module(_BACKENDS[backend_name()])
+
+
+def _replicas() -> List:
+    """Google Sheets as an optional write-only replica of a non-Sheets primary."""
+    if backend_name() == "sheets":
+        return []
+    if os.getenv("STORAGE_REPLICATE_TO_SHEETS", "0").strip().lower() not in ("1", "true", "yes"):
+        return []
+    if not _sheets_configured():
+        return []
+    return [importlib.import_module("excel_storage")]
+
+
+def _replicate(method: str, *args, **kwargs) -> None:
+    for replica in _replicas():
+        try:
+            getattr(replica, method)(*args, **kwargs)
+        except Exception as e:
+            print(f"Replication to {replica.__name__} failed: {e}")
+
+
+def spool_status() -> Optional[Dict]:
+    """Local write-spool status of the Google Sheets store (primary or replica), if any."""
+    sheets = [_backend()] if backend_name() == "sheets" else _replicas()
+    if not sheets or not _sheets_configured():
+        return None
+    return sheets[0].spool_status()
+
+
+def flush_spool() -> None:
+    sheets = [_backend()] if backend_name() == "sheets" else _replicas()
+    for module in sheets:
+        module.flush_pending_rows()
+
+
+def spool_dead_letters(limit: int = 20) -> List[Dict]:
+    sheets = [_backend()] if backend_name() == "sheets" else _replicas()
+    if not sheets or not _sheets_configured():
+        return []
+    return sheets[0].spool_dead_letters(limit)
+
+
+def requeue_dead_letters() -> int:
+    sheets = [_backend()] if backend_name() == "sheets" else _replicas()
+    return sum(module.requeue_dead_letters() for module in sheets)
+
+
+def location() -> str:
+    return _backend().EXCEL_PATH
+
+
+def append_rows(rows: Iterable[Dict]) -> None:
+    rows = list(rows or [])
+    _backend().append_rows(rows)
+    _replicate("append_rows", rows)
+
+
+def append_subreddit_block(
+    subreddit: str,
+    query: Optional[str] = None,
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+) -> None:
+    _backend().append_subreddit_block(subreddit, query=query, title=title, description=description)
+    _replicate("append_subreddit_block", subreddit, query=query, title=title, description=description)
+
+
+def append_post_comment_block(post: Dict, comments: Iterable[Dict], show_subreddit: bool) -> None:
+    comments = list(comments or [])
+    _backend().append_post_comment_block(post, comments, show_subreddit)
+    _replicate("append_post_comment_block", post, comments, show_subreddit)
+
+
+def append_subreddits(records: Iterable[Dict]) -> None:
+    records = list(records or [])
+    _backend().append_subreddits(records)
+    _replicate("append_subreddits", records)
+
+
+def get_all_rows() -> List[Dict]:
+    return _backend().get_all_rows()
+
+
+def get_recent_rows(limit: int = 50) -> List[Dict]:
+    return _backend().get_recent_rows(limit=limit)
+
+
+def get_subreddits(query: Optional[str] = None) -> List[str]:
+    return _backend().get_subreddits(query=query)
+
+
+def counts() -> Dict[str, int]:
+    return _backend().counts()
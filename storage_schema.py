@@ -0,0 +1,115 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from comments_codec import V1_ARRAY_COLUMNS, comment_count, encode_comments, is_v2, to_v1_columns
+
+
+# v1 layout: comments stored twice, as six parallel JSON arrays and as comments_array.
+HEADERS_V1 = [
+    "subreddit",
+    "post",
+    "posted on",
+    "author",
+    "likes",
+    "Comments",
+    "post_age_days",
+    "post_flair",
+    "post_id",
+    "post_title",
+    "post_selftext",
+    "post_url",
+    "post_upvote_ratio",
+    "post_num_comments",
+    "post_rank",
+    "comment_id_array",
+    "comment_author_array",
+    "comment_body_array",
+    "comment_ups_array",
+    "comment_url_array",
+    "comment_created_utc_array",
+    "comments_array",
+    "imgbb_link",
+    "scraped_at_utc",
+]
+
+# v2 layout: comments stored once in comments_array using comments_codec.
+HEADERS = [h for h in HEADERS_V1 if h not in V1_ARRAY_COLUMNS.values()]
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _dt_to_iso(val):
+    return val.isoformat() if val else None
+
+
+def subreddit_block_row(
+    subreddit: str,
+    query: Optional[str] = None,
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+) -> Dict:
+    row = {h: None for h in HEADERS}
+    row["subreddit"] = subreddit
+    row["scraped_at_utc"] = _now_iso()
+    return row
+
+
+def post_comment_block_row(post: Dict, comments: Iterable[Dict], show_subreddit: bool) -> Dict:
+    post_rank = post.get("post_rank")
+    post_label = f"post{post_rank}" if post_rank else "post"
+    comment_rows = list(comments) if comments else []
+    comments_array = [
+        {
+            "comment_id": c.get("id"),
+            "author": c.get("author"),
+            "body": c.get("body"),
+            "ups": c.get("ups"),
+            "url": c.get("url"),
+            "created_utc": _dt_to_iso(c.get("created_utc")),
+        }
+        for c in comment_rows
+    ]
+
+    return {
+        "subreddit": post.get("subreddit") if show_subreddit else None,
+        "post": post_label,
+        "posted on": _dt_to_iso(post.get("created_utc")),
+        "author": post.get("author"),
+        "likes": post.get("ups"),
+        "Comments": len(comment_rows),
+        "post_age_days": post.get("post_age_days"),
+        "post_flair": post.get("link_flair_text"),
+        "post_id": post.get("id"),
+        "post_title": post.get("title"),
+        "post_selftext": post.get("selftext"),
+        "post_url": post.get("url"),
+        "post_upvote_ratio": post.get("upvote_ratio"),
+        "post_num_comments": post.get("num_comments"),
+        "post_rank": post_rank,
+        "comments_array": encode_comments(comments_array),
+        "imgbb_link": post.get("imgbb_link"),
+        "scraped_at_utc": _now_iso(),
+    }
+
+
+def count_comments(row: Dict) -> int:
+    return comment_count(row.get("comments_array"))
+
+
+def row_values(row: Dict, headers: List[str]) -> List:
+    """Lay a row dict out for a worksheet, expanding v2 comments for v1-layout sheets."""
+    if "comment_body_array" in headers and is_v2(row.get("comments_array")):
+        row = {**row, **to_v1_columns(row.get("comments_array"))}
+    return [row.get(h) for h in headers]
+
+
+def summarize_rows(rows: Iterable[Dict]) -> Dict[str, int]:
+    rows = list(rows)
+    return {
+        "rows": len(rows),
+        "subreddits": len({r.get("subreddit") for r in rows if r.get("subreddit")}),
+        "posts": len({r.get("post_id") for r in rows if r.get("post_id")}),
+        "comments": sum(count_comments(r) for r in rows),
+    }
@@ -1,12 +1,15 @@
 import os
 import streamlit as st
-import json
 import importlib
 from pathlib import Path
 from dotenv import load_dotenv
 
-from gemini_client import generate_text_with_gemini
+from batch_generation import generate_batched
+from comments_codec import comment_count, encode_comments
+from generation_executor import generate_many, stream_many
 from main import fetch_for_post_urls, fetch_for_subreddits
+from prompt_packing import dumps_compact, pack_posts
+from run_metrics import get_run_metrics
 from scraper_utils import get_fetch_trace
 
 load_dotenv()
@@ -64,6 +67,9 @@ reddit_user_agent = _get_secret("REDDIT_USER_AGENT", "snapreddit-bot/1.0")
 google_sheet_id = _get_secret("GOOGLE_SHEET_ID")
 google_worksheet_name = _get_secret("GOOGLE_WORKSHEET_NAME", "scraped_data")
 google_service_account_json = _get_secret("GOOGLE_SERVICE_ACCOUNT_JSON")
+storage_backend = _get_secret("STORAGE_BACKEND", "sheets")
+sqlite_db_path = _get_secret("SQLITE_DB_PATH")
+storage_replicate_to_sheets = _get_secret("STORAGE_REPLICATE_TO_SHEETS")
 
 if reddit_user_agent:
     os.environ["REDDIT_USER_AGENT"] = reddit_user_agent
@@ -73,21 +79,60 @@ if google_worksheet_name:
     os.environ["GOOGLE_WORKSHEET_NAME"] = google_worksheet_name
 if google_service_account_json:
     os.environ["GOOGLE_SERVICE_ACCOUNT_JSON"] = google_service_account_json
+if storage_backend:
+    os.environ["STORAGE_BACKEND"] = storage_backend
+if sqlite_db_path:
+    os.environ["SQLITE_DB_PATH"] = sqlite_db_path
+if storage_replicate_to_sheets:
+    os.environ["STORAGE_REPLICATE_TO_SHEETS"] = storage_replicate_to_sheets
 
 sheet_storage = None
 sheet_init_error = ""
 try:
-    import excel_storage as _sheet_storage
+    # Backends read their settings at import time; reload so secrets/env updates apply.
+    if storage_backend.strip().lower() == "sqlite":
+        importlib.reload(importlib.import_module("sqlite_storage"))
+    if storage_backend.strip().lower() != "sqlite" or storage_replicate_to_sheets:
+        importlib.reload(importlib.import_module("excel_storage"))
+    import storage as _sheet_storage
     sheet_storage = importlib.reload(_sheet_storage)
 except Exception as e:
     sheet_init_error = str(e)
 
+storage_ready = bool(sheet_storage and sheet_storage.is_configured())
+storage_label = sheet_storage.backend_label() if sheet_storage else "Google Sheets"
+
 with st.sidebar:
     st.subheader("Storage")
-    if google_sheet_id and google_service_account_json and sheet_storage:
-        st.success("Google Sheets connected")
+    if storage_ready:
+        st.success(f"{storage_label} connected")
     else:
         st.info("Using session-only storage (configure Google Sheets for persistence).")
+    if storage_ready:
+        try:
+            spool = sheet_storage.spool_status()
+        except Exception as e:
+            spool = None
+            st.caption(f"Write spool unavailable: {e}")
+        if spool:
+            with st.expander(f"Write spool ({spool['depth']} pending)", expanded=bool(spool["depth"] or spool.get("dead_letters"))):
+                spool_col1, spool_col2 = st.columns(2)
+                spool_col1.metric("Pending rows", spool["depth"])
+                spool_col2.metric("Oldest entry", f"{spool['oldest_age_sec']:.0f}s")
+                if spool["last_error"]:
+                    st.caption(f"Last error (attempt {spool['max_attempts']}): {spool['last_error']}")
+                st.caption(f"Spool file: {spool['path']}")
+                if spool.get("dead_letters"):
+                    st.warning(f"{spool['dead_letters']} rows were rejected by Google Sheets and set aside.")
+                    st.dataframe(sheet_storage.spool_dead_letters(), use_container_width=True)
+                    if st.button("Requeue rejected rows"):
+                        st.success(f"Requeued {sheet_storage.requeue_dead_letters()} rows.")
+                if spool["depth"] and st.button("Flush spool now"):
+                    try:
+                        sheet_storage.flush_spool()
+                        st.success("Spool flushed.")
+                    except Exception as e:
+                        st.warning(f"Flush failed: {e}")
 
 if "last_results" not in st.session_state:
     st.session_state["last_results"] = []
@@ -105,11 +150,31 @@ if "sheet_bootstrap_done" not in st.session_state:
 
 def _load_rows_from_google_sheet():
     if not sheet_storage:
-        return [], "Google Sheets storage module unavailable."
+        return [], "Storage module unavailable."
     rows = sheet_storage.get_all_rows()
     return rows, ""
 
 
+def _show_run_metrics():
+    metrics = get_run_metrics(clear=True)
+    saved = metrics.get("image_bytes_saved", [])
+    skipped = metrics.get("imgbb_uploads_skipped", 0)
+    sheets_calls = metrics.get("sheets_api_calls", 0)
+    if not saved and not skipped and not sheets_calls:
+        return
+    with st.expander("Run metrics"):
+        if sheets_calls:
+            st.caption(f"Google Sheets API calls: {sheets_calls}")
+        if skipped:
+            st.caption(f"Skipped {skipped} ImgBB uploads (identical images already uploaded).")
+        if saved:
+            st.caption(
+                f"Image optimization saved {metrics.get('image_bytes_saved_total', 0) / 1024:.1f} KB "
+                f"across {len(saved)} images."
+            )
+            st.dataframe(saved, use_container_width=True)
+
+
 def _results_to_rows(results):
     rows = []
     for item in results or []:
@@ -143,13 +208,7 @@ def _results_to_rows(results):
             "post_upvote_ratio": post.get("upvote_ratio"),
             "post_num_comments": post.get("num_comments"),
             "post_rank": post.get("post_rank"),
-            "comment_id_array": json.dumps([c.get("comment_id") for c in comments_array], ensure_ascii=False),
-            "comment_author_array": json.dumps([c.get("author") for c in comments_array], ensure_ascii=False),
-            "comment_body_array": json.dumps([c.get("body") for c in comments_array], ensure_ascii=False),
-            "comment_ups_array": json.dumps([c.get("ups") for c in comments_array], ensure_ascii=False),
-            "comment_url_array": json.dumps([c.get("url") for c in comments_array], ensure_ascii=False),
-            "comment_created_utc_array": json.dumps([c.get("created_utc") for c in comments_array], ensure_ascii=False),
-            "comments_array": json.dumps(comments_array, ensure_ascii=False),
+            "comments_array": encode_comments(comments_array),
             "imgbb_link": post.get("imgbb_link"),
             "scraped_at_utc": post.get("scraped_at_utc"),
         }
@@ -157,26 +216,41 @@ def _results_to_rows(results):
     return rows
 
 
+def _merge_rows(existing, new_rows):
+    # Mirror the storage upsert: a re-collected post replaces its earlier row.
+    merged = list(existing)
+    positions = {r.get("post_id"): i for i, r in enumerate(merged) if r.get("post_id")}
+    for row in new_rows:
+        post_id = row.get("post_id")
+        if post_id and post_id in positions:
+            merged[positions[post_id]] = row
+        else:
+            if post_id:
+                positions[post_id] = len(merged)
+            merged.append(row)
+    return merged
+
+
 if not st.session_state.get("sheet_bootstrap_done", False):
     st.session_state["sheet_bootstrap_done"] = True
-    can_bootstrap = bool(google_sheet_id and google_service_account_json and sheet_storage)
+    can_bootstrap = storage_ready
     if can_bootstrap:
         try:
             initial_rows, err = _load_rows_from_google_sheet()
             if err:
-                st.warning(f"Google Sheets load skipped: {err}")
+                st.warning(f"{storage_label} load skipped: {err}")
             else:
                 st.session_state["stored_rows"] = initial_rows
                 if initial_rows:
-                    st.info(f"Loaded {len(initial_rows)} existing rows from Google Sheets.")
+                    st.info(f"Loaded {len(initial_rows)} existing rows from {storage_label}.")
         except Exception as e:
-            st.warning(f"Google Sheets initial load failed: {e}")
+            st.warning(f"{storage_label} initial load failed: {e}")
     elif sheet_init_error:
-        st.warning(f"Google Sheets integration unavailable: {sheet_init_error}")
+        st.warning(f"{storage_label} integration unavailable: {sheet_init_error}")
 
 stored_rows = st.session_state.get("stored_rows", [])
 status_col1, status_col2, status_col3 = st.columns(3)
-status_col1.metric("Google Sheets", "Connected" if (google_sheet_id and google_service_account_json and sheet_storage) else "Not Connected")
+status_col1.metric(storage_label, "Connected" if storage_ready else "Not Connected")
 status_col2.metric("Saved Posts", len({r.get("post_id") for r in stored_rows if r.get("post_id")}))
 status_col3.metric("Ready to Generate", "Yes" if len(stored_rows) > 0 else "No")
 
@@ -218,6 +292,7 @@ with tab_subs:
         elif not imgbb_api_key.strip():
             st.error("Missing ImgBB key. Add `IMGBB_API_KEY` in your app secrets.")
         else:
+            get_run_metrics(clear=True)
             with st.spinner("Fetching posts/comments from subreddit list..."):
                 results = fetch_for_subreddits(
                     subs,
@@ -227,14 +302,15 @@ with tab_subs:
                 )
             st.session_state["last_results"] = results
             rows = _results_to_rows(results)
-            st.session_state["stored_rows"].extend(rows)
-            if rows and google_sheet_id and google_service_account_json and sheet_storage:
+            st.session_state["stored_rows"] = _merge_rows(st.session_state["stored_rows"], rows)
+            if rows and storage_ready:
                 try:
                     sheet_storage.append_rows(rows)
-                    st.info(f"Saved {len(rows)} rows to Google Sheets.")
+                    st.info(f"Saved {len(rows)} rows to {storage_label}.")
                 except Exception as e:
-                    st.warning(f"Could not save to Google Sheets: {e}")
+                    st.warning(f"Could not save to {storage_label}: {e}")
             st.success(f"Done. Retrieved {len(results)} posts.")
+            _show_run_metrics()
             if not results:
                 st.warning(
                     "Retrieved 0 posts. Possible causes: subreddit has mostly filtered posts, "
@@ -258,6 +334,7 @@ with tab_urls:
         elif not imgbb_api_key.strip():
             st.error("Missing ImgBB key. Add `IMGBB_API_KEY` in your app secrets.")
         else:
+            get_run_metrics(clear=True)
             with st.spinner("Fetching post details from URL list..."):
                 results = fetch_for_post_urls(
                     post_urls=post_urls,
@@ -266,14 +343,15 @@ with tab_urls:
                 )
             st.session_state["last_results"] = results
             rows = _results_to_rows(results)
-            st.session_state["stored_rows"].extend(rows)
-            if rows and google_sheet_id and google_service_account_json and sheet_storage:
+            st.session_state["stored_rows"] = _merge_rows(st.session_state["stored_rows"], rows)
+            if rows and storage_ready:
                 try:
                     sheet_storage.append_rows(rows)
-                    st.info(f"Saved {len(rows)} rows to Google Sheets.")
+                    st.info(f"Saved {len(rows)} rows to {storage_label}.")
                 except Exception as e:
-                    st.warning(f"Could not save to Google Sheets: {e}")
+                    st.warning(f"Could not save to {storage_label}: {e}")
             st.success(f"Done. Retrieved {len(results)} posts.")
+            _show_run_metrics()
             if not results:
                 st.warning(
                     "Retrieved 0 posts. Possible causes: URL unavailable, temporary Reddit rate-limit/block, "
@@ -289,8 +367,8 @@ with tab_script:
     with header_col1:
         st.subheader("Script Generator (Gemini)")
     with header_col2:
-        if st.button("Refresh from Google Sheets", use_container_width=True):
-            if not (google_sheet_id and google_service_account_json and sheet_storage):
+        if st.button(f"Refresh from {storage_label}", use_container_width=True):
+            if not storage_ready:
                 st.error("Google Sheets is not configured yet. Add `GOOGLE_SHEET_ID` and `GOOGLE_SERVICE_ACCOUNT_JSON`.")
             else:
                 try:
@@ -299,9 +377,9 @@ with tab_script:
                         st.error(err)
                     else:
                         st.session_state["stored_rows"] = fetched_rows
-                        st.success(f"Loaded {len(fetched_rows)} rows from Google Sheets.")
+                        st.success(f"Loaded {len(fetched_rows)} rows from {storage_label}.")
                 except Exception as e:
-                    st.error(f"Failed to load rows from Google Sheets: {e}")
+                    st.error(f"Failed to load rows from {storage_label}: {e}")
     default_prompt = """You are my Snaphomz CMO + Apple-level Creative Director + Short-form Scriptwriter.
 
 Generate Instagram Reel scripts from ONLY this data:
@@ -473,53 +551,101 @@ SCRIPT 1:
 
     st.caption(f"Selected posts: {len(selected_rows)}")
 
-    # Keep only required fields for Gemini input.
-    llm_rows = [
-        {
-            "post_title": r.get("post_title"),
-            "post_selftext": r.get("post_selftext"),
-            "Comments": r.get("Comments"),
-            "comments_array": r.get("comments_array"),
-        }
-        for r in selected_rows
-    ]
+    # Keep only required fields for Gemini input, packed to the token budget.
+    llm_rows = pack_posts(selected_rows)
 
     if llm_rows:
         st.markdown("**Selected Data Preview**")
         st.dataframe(llm_rows[:5], use_container_width=True)
 
+    force_regenerate = st.checkbox(
+        "Force regenerate (ignore cached scripts)",
+        value=False,
+        key="force_regenerate",
+    )
+    stream_live = st.checkbox(
+        "Stream output live",
+        value=True,
+        key="stream_live",
+        help="Show scripts as they are written. Posts still generate in parallel.",
+    )
+    batch_posts = st.checkbox(
+        "Batch several posts per request",
+        value=False,
+        key="batch_posts",
+        disabled=stream_live,
+        help="Sends the prompt once for a group of posts and splits the JSON answer per post.",
+    )
+
     if st.button("Generate Scripts", use_container_width=True, key="generate_scripts"):
         if not gemini_api_key.strip():
             st.error("Missing Gemini key. Add `GEMINI_API_KEY` in your app secrets.")
         elif not llm_rows:
-            st.error("No saved content selected. Fetch data first, then refresh from Google Sheets.")
+            st.error(f"No saved content selected. Fetch data first, then refresh from {storage_label}.")
         else:
             generated_blocks = []
             progress = st.progress(0, text="Generating scripts...")
-            total = len(selected_rows)
-
-            for i, row in enumerate(selected_rows, start=1):
-                llm_row = {
-                    "post_title": row.get("post_title"),
-                    "post_selftext": row.get("post_selftext"),
-                    "Comments": row.get("Comments"),
-                    "comments_array": row.get("comments_array"),
-                }
-                row_prompt = (
-                    f"{default_prompt}\n\n"
+
+            prompts = []
+            batch_rows = []
+            for row, llm_row in zip(selected_rows, llm_rows):
+                # default_prompt is identical for every post; it goes out as a cached prefix.
+                prompts.append(
                     f"Generate exactly {int(scripts_per_post)} scripts for this post.\n\n"
                     "DATASET (JSON):\n"
-                    f"{json.dumps([llm_row], ensure_ascii=False, indent=2)}\n\n"
+                    f"{dumps_compact([llm_row])}\n\n"
                     "Now generate scripts."
                 )
-                try:
-                    scripts = generate_text_with_gemini(
-                        api_key=gemini_api_key,
-                        prompt=row_prompt,
-                        model=gemini_model,
-                    )
-                except Exception as e:
-                    scripts = f"Generation failed for post_id {row.get('post_id')}: {e}"
+                batch_rows.append({"post_id": row.get("post_id"), **llm_row})
+
+            hits_before = get_run_metrics().get("gemini_cache_hits", 0)
+            if stream_live:
+                results = [""] * len(prompts)
+                live = []
+                texts = [""] * len(prompts)
+                for i, row in enumerate(selected_rows, start=1):
+                    st.markdown(f"**Post {i}: {row.get('post_title') or 'Untitled'}**")
+                    live.append(st.empty())
+                done = 0
+                for i, chunk, result in stream_many(
+                    gemini_api_key, prompts, gemini_model, force=force_regenerate, prefix=default_prompt
+                ):
+                    if chunk is not None:
+                        texts[i] += chunk
+                        live[i].markdown(texts[i])
+                        continue
+                    results[i] = result
+                    if isinstance(result, Exception):
+                        live[i].warning(f"Generation failed: {result}")
+                    done += 1
+                    progress.progress(int(done * 100 / len(prompts)), text=f"Generated {done}/{len(prompts)} posts")
+            elif batch_posts:
+                results = generate_batched(
+                    api_key=gemini_api_key,
+                    model=gemini_model,
+                    preamble=default_prompt,
+                    posts=batch_rows,
+                    scripts_per_post=int(scripts_per_post),
+                    fallback_prompts=prompts,
+                    force=force_regenerate,
+                    on_progress=lambda done, n: progress.progress(int(done * 100 / n), text=f"Generated {done}/{n} posts"),
+                )
+            else:
+                results = generate_many(
+                    api_key=gemini_api_key,
+                    prompts=prompts,
+                    model=gemini_model,
+                    on_progress=lambda done, n: progress.progress(int(done * 100 / n), text=f"Generated {done}/{n} posts"),
+                    force=force_regenerate,
+                    prefix=default_prompt,
+                )
+            cache_hits = get_run_metrics().get("gemini_cache_hits", 0) - hits_before
+            if cache_hits:
+                st.caption(f"Served {cache_hits} of {len(prompts)} posts from the script cache.")
+
+            for row, scripts in zip(selected_rows, results):
+                if isinstance(scripts, Exception):
+                    scripts = f"Generation failed for post_id {row.get('post_id')}: {scripts}"
 
                 reddit_link = row.get("post_url")
                 if not reddit_link and row.get("subreddit") and row.get("post_id"):
@@ -534,7 +660,6 @@ SCRIPT 1:
                         "scripts": scripts,
                     }
                 )
-                progress.progress(int(i * 100 / total), text=f"Generated {i}/{total} posts")
 
             st.session_state["generated_by_post"] = generated_blocks
             progress.empty()
@@ -614,13 +739,7 @@ else:
 
 st.subheader("Session Snapshot")
 stored_rows = st.session_state.get("stored_rows", [])
-total_comments = 0
-for r in stored_rows:
-    try:
-        arr = json.loads(r.get("comments_array") or "[]")
-        total_comments += len(arr) if isinstance(arr, list) else 0
-    except Exception:
-        pass
+total_comments = sum(comment_count(r.get("comments_array")) for r in stored_rows)
 metrics = st.columns(4)
 metrics[0].metric("rows", len(stored_rows))
 metrics[1].metric("subreddits", len({r.get("subreddit") for r in stored_rows if r.get("subreddit")}))
@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_extraction as be  # noqa: E402
+
+
+_TOPICS = [
+    "our landlord kept the whole security deposit",
+    "mortgage rates doubled before we could lock",
+    "the HOA fined us for a fence it approved",
+    "closing got delayed three times by the lender",
+    "property taxes jumped after the reassessment",
+]
+
+
+def _items(n):
+    return [
+        {"text": f"Problem number {i}: {_TOPICS[i]}. More details here.", "post_url": f"u{i}", "source": "post"}
+        for i in range(n)
+    ]
+
+
+def _store(into):
+    def store(docs):
+        into.extend(docs)
+        return len(docs)
+
+    return store
+
+
+def _run(job_id, client, root, into):
+    be.submit_job(job_id, client, root)
+    be.wait_for_job(job_id, client, poll_sec=0, root=root)
+    return be.ingest_job(job_id, client, store=_store(into), root=root)
+
+
+def test_job_splits_into_parts_and_fans_out(tmp_path, monkeypatch):
+    monkeypatch.setenv("CASCADE_PREFILTER", "0")
+    monkeypatch.setenv("BATCH_MAX_REQUESTS", "2")
+    root = str(tmp_path)
+    items = _items(5) + [dict(_items(1)[0], post_url="dup")]
+    job_id = be.create_job(items, root=root)
+
+    state = be.load_state(job_id, root)
+    assert state["requests"] == 5
+    assert [p["requests"] for p in state["parts"]] == [2, 2, 1]
+
+    stored = []
+    client = be.LocalBatchClient(root=str(tmp_path / "local"))
+    assert _run(job_id, client, root, stored) == 6
+    assert sorted(d["post_url"] for d in stored) == ["dup", "u0", "u1", "u2", "u3", "u4"]
+    assert stored[0]["issues"] == ["Problem number 0: our landlord kept the whole security deposit"]
+
+    # Submitting and ingesting again is a no-op.
+    be.submit_job(job_id, client, root)
+    assert be.ingest_job(job_id, client, store=_store(stored), root=root) == 0
+
+
+def test_failed_requests_are_resubmitted(tmp_path, monkeypatch):
+    monkeypatch.setenv("CASCADE_PREFILTER", "0")
+    root = str(tmp_path)
+    job_id = be.create_job(_items(3), root=root, dedup=False)
+    failing = {"Problem number 1"}
+
+    def responder(body):
+        text = body["messages"][-1]["content"]
+        if any(f in text for f in failing):
+            raise RuntimeError("rate limited")
+        return be.echo_responder(body)
+
+    stored = []
+    client = be.LocalBatchClient(responder, root=str(tmp_path / "local"))
+    assert _run(job_id, client, root, stored) == 2
+    assert be.load_state(job_id, root)["parts"][0]["failed"] == ["item-1"]
+
+    failing.clear()
+    assert be.resubmit_failed(job_id, client, root) == 1
+    assert _run(job_id, client, root, stored) == 1
+    assert sorted(d["post_url"] for d in stored) == ["u0", "u1", "u2"]
+    assert be.resubmit_failed(job_id, client, root) == 0
+
+
+def test_irrelevant_answers_store_nothing(tmp_path, monkeypatch):
+    monkeypatch.setenv("CASCADE_PREFILTER", "0")
+    root = str(tmp_path)
+    job_id = be.create_job(_items(2), root=root)
+    client = be.LocalBatchClient(lambda body: json.dumps({"relevant": False, "issues": []}), root=str(tmp_path / "l"))
+    stored = []
+    assert _run(job_id, client, root, stored) == 0
+    assert stored == []
+
+
+def test_empty_plan_creates_no_job(tmp_path):
+    assert be.create_job([{"text": "   "}], root=str(tmp_path)) is None
+    assert os.listdir(tmp_path) == []
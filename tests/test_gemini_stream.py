@@ -0,0 +1,21 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_client import GeminiClient  # noqa: E402
+from gemini_stub_server import StubState, serve  # noqa: E402
+
+
+def test_stream_decodes_non_ascii_text():
+    server = serve("127.0.0.1", 0, StubState(["gemini-1.5-flash"], min_cache_tokens=1024, fail_every=0, delay=0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = GeminiClient("test-key", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1beta")
+        prompt = "Préstamo hipotecario — “cierre” en 東京 🏠"
+        text = "".join(client.stream(prompt, model="gemini-1.5-flash"))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert prompt in text
@@ -0,0 +1,66 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_dedup import MinHashDeduper, representative  # noqa: E402
+
+
+BOILERPLATE = (
+    "please read the rules before posting this subreddit is for us real estate questions only and posts "
+    "about other countries will be removed by the moderators and repeat offenders will be banned from the "
+    "community for at least thirty days so keep it civil"
+).split()
+
+
+def _variant(i, rng):
+    words = list(BOILERPLATE)
+    words[rng.randrange(len(words))] = f"x{i}"
+    return " ".join(words)
+
+
+def test_groups_near_duplicates_and_keeps_distinct_texts_apart():
+    base = "the landlord kept our whole security deposit after we moved out of the apartment in ohio last spring"
+    texts = [
+        base,
+        "something entirely different about cooking pasta at home tonight with friends and family",
+        base + " today",
+        "> " + base + "\nagreed, same thing happened to us",
+        base.upper(),
+    ]
+    groups = sorted(MinHashDeduper(threshold=0.7).groups(texts))
+    assert groups == [[0, 2, 4], [1], [3]]
+    assert representative([0, 2, 4], texts) == 2
+
+
+def test_empty_normalized_texts_are_not_grouped():
+    texts = ["https://example.com/a", "> only a quote", "https://example.com/b", ""]
+    assert sorted(MinHashDeduper().groups(texts)) == [[0], [1], [2], [3]]
+
+
+def test_non_latin_texts_compare_on_their_own_words():
+    a = "這是 一個 關於 房地產 問題 的 長 文本 我們 的 房東 不 退 押金"
+    b = "完全 不同 的 內容 關於 烹飪 和 晚餐 以及 週末 的 計劃 安排"
+    assert sorted(MinHashDeduper().groups([a, b, a])) == [[0, 2], [1]]
+
+
+def test_large_bucket_stays_linear():
+    rng = random.Random(0)
+    small = [_variant(i, rng) for i in range(1000)]
+    large = [_variant(i, rng) for i in range(8000)]
+    deduper = MinHashDeduper()
+
+    started = time.perf_counter()
+    small_groups = deduper.groups(small)
+    small_sec = time.perf_counter() - started
+    started = time.perf_counter()
+    large_groups = deduper.groups(large)
+    large_sec = time.perf_counter() - started
+
+    # Near-duplicate boilerplate collapses into few groups...
+    assert len(small_groups) < len(small) // 4
+    assert len(large_groups) < len(large) // 4
+    # ...and 8x the texts costs roughly 8x the time, not 64x.
+    assert large_sec < max(small_sec, 0.05) * 24
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+_TOKEN = re.compile(r"[\w']+")
+# Quoted reply lines ("> ...") repeat the parent; drop them before hashing.
+_QUOTE_LINE = re.compile(r"^\s*>.*$", re.MULTILINE)
+_URL = re.compile(r"https?://\S+")
+
+
+def normalize(text: str) -> List[str]:
+    text = _URL.sub(" ", _QUOTE_LINE.sub(" ", (text or "").lower()))
+    return _TOKEN.findall(text)
+
+
+def _shingles(tokens: List[str], size: int) -> np.ndarray:
+    if len(tokens) < size:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64)
+
+
+def _lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows) with bands * rows <= num_perm whose S-curve midpoint is closest to threshold."""
+    best = (1, num_perm)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class MinHashDeduper:
+    """
+    Groups near-identical texts: MinHash signatures over word shingles,
+    banded LSH to find candidate pairs in roughly linear time, then an
+    estimated-Jaccard check against threshold before merging groups.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, num_perm: Optional[int] = None, shingle_size: int = 3):
+        self.threshold = threshold if threshold is not None else float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+        self.num_perm = num_perm or int(os.getenv("DEDUP_NUM_PERM", "128"))
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _lsh_params(self.threshold, self.num_perm)
+        rng = np.random.RandomState(1)
+        # Multiply-shift hashing: odd 64-bit multipliers, keep the top 32 bits.
+        self._a = rng.randint(1, 2**31, size=self.num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.randint(0, 2**31, size=self.num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        hashes = _shingles(normalize(text), self.shingle_size)
+        if hashes.size == 0:
+            return None
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)
+        return permuted.min(axis=0)
+
+    def groups(self, texts: List[str]) -> List[List[int]]:
+        """Indexes of texts grouped by near-duplication, each group in input order."""
+        parent = list(range(len(texts)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i: int, j: int) -> None:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+        # Exact duplicates (after normalization) first; they skip MinHash entirely.
+        exact: Dict[str, int] = {}
+        unique = []
+        for i, text in enumerate(texts):
+            tokens = normalize(text)
+            if not tokens:
+                # Nothing left to compare (only a URL or a quote): keep it on its own.
+                continue
+            key = hashlib.sha1(" ".join(tokens).encode("utf-8")).hexdigest()
+            if key in exact:
+                union(exact[key], i)
+            else:
+                exact[key] = i
+                unique.append(i)
+
+        signatures = {i: self.signature(texts[i]) for i in unique}
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        for i, sig in signatures.items():
+            if sig is None:
+                continue
+            for band in range(self.bands):
+                chunk = sig[band * self.rows : (band + 1) * self.rows].tobytes()
+                buckets.setdefault((band, chunk), []).append(i)
+
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # One representative signature per component already seen in this
+            # bucket, so near-duplicate boilerplate costs one comparison per
+            # member instead of one per pair.
+            reps: List[int] = []
+            for member in members:
+                root = find(member)
+                if any(find(r) == root for r in reps):
+                    continue
+                if reps:
+                    similarity = np.mean(np.stack([signatures[r] for r in reps]) == signatures[member], axis=1)
+                    matched = [r for r, sim in zip(reps, similarity) if sim >= self.threshold]
+                else:
+                    matched = []
+                for r in matched:
+                    union(r, member)
+                # Components merged through member now share one representative.
+                reps = [r for r in reps if r not in matched[1:]]
+                if not matched:
+                    reps.append(member)
+
+        grouped: Dict[int, List[int]] = {}
+        for i in range(len(texts)):
+            grouped.setdefault(find(i), []).append(i)
+        return list(grouped.values())
+
+
+def representative(group: List[int], texts: List[str]) -> int:
+    """The member with the most text, so extraction sees the fullest version."""
+    return max(group, key=lambda i: len(texts[i] or ""))
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class UploadRegistry:
+    """
+    Local map of image content hash -> ImgBB URL. Entries expire together
+    with the upload itself so a deleted ImgBB image is never reused.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, digest: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if not entry:
+                return None
+            expires_at = entry.get("expires_at")
+            if expires_at and expires_at <= time.time():
+                del self._entries[digest]
+                self._save()
+                return None
+            return entry.get("url")
+
+    def record(self, digest: str, url: str, expiration_sec: int = 0) -> None:
+        if not url:
+            return
+        now = time.time()
+        with self._lock:
+            self._entries[digest] = {
+                "url": url,
+                "uploaded_at": now,
+                "expires_at": now + expiration_sec if expiration_sec else None,
+            }
+            self._save()
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_REGISTRY: Optional[UploadRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> UploadRegistry:
+    global _REGISTRY
+    path = os.getenv("IMGBB_REGISTRY_PATH", os.path.join(".cache", "imgbb_registry.json"))
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None or _REGISTRY.path != path:
+            _REGISTRY = UploadRegistry(path)
+        return _REGISTRY